@@ -3,23 +3,28 @@ Dataviz - Frais de représentation des maires
 Analyse des dépenses par commune à l'approche des municipales 2026
 """
 
+import os
+
 import streamlit as st
+import streamlit.components.v1 as components
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-import folium
-from folium.plugins import MarkerCluster
-from streamlit_folium import st_folium
 import numpy as np
 
-
-def fmt_fr(num, decimals=0):
-    """Formate un nombre au format français: 1 234 567,89"""
-    if decimals > 0:
-        formatted = f"{num:,.{decimals}f}"
-    else:
-        formatted = f"{num:,.0f}"
-    return formatted.replace(',', ' ').replace('.', ',')
+from bootstrap import STAT_LABELS, pairwise_tests, party_intervals
+from cache import cache_manager
+from client import render_client_view
+from cube import DIM_LABELS, DIMS, MEASURES, cube_for_selection, pivot
+from data import dataset_facets, load_dataset, memory_report
+from export import FORMATS, available_formats, export_selection
+from figures import budget_preview, build_budget_figures
+from formatting import fmt_fr
+from maps import create_map, map_preview
+from progressive import PREVIEW_ROWS, ProgressiveRenderer
+from query import EXAMPLE_QUERY, MAX_ROWS, TABLE_NAME, TIMEOUT_S, QueryError, run_query
+from similarity import SHARE_COLS, similar_communes, similarity_index
+from url_state import PARAMS, cached_selection, decode, encode
+from validation import validate_dataset
+import warmup
 
 
 # Configuration de la page
@@ -141,6 +146,26 @@ st.markdown("""
         vertical-align: middle;
         opacity: 0.6;
     }
+    .stTabs [data-baseweb="tab"]:nth-child(5)::before {
+        content: "";
+        display: inline-block;
+        width: 16px;
+        height: 16px;
+        margin-right: 6px;
+        background: url("data:image/svg+xml,%3Csvg xmlns='http://www.w3.org/2000/svg' width='24' height='24' fill='none' stroke='currentColor' stroke-width='1.5'%3E%3Cpath d='M3 3h18v18H3z M3 9h18 M9 3v18'/%3E%3C/svg%3E") center/contain no-repeat;
+        vertical-align: middle;
+        opacity: 0.6;
+    }
+    .stTabs [data-baseweb="tab"]:nth-child(6)::before {
+        content: "";
+        display: inline-block;
+        width: 16px;
+        height: 16px;
+        margin-right: 6px;
+        background: url("data:image/svg+xml,%3Csvg xmlns='http://www.w3.org/2000/svg' width='24' height='24' fill='none' stroke='currentColor' stroke-width='1.5'%3E%3Cpath d='M4 17l6-5-6-5 M12 19h8'/%3E%3C/svg%3E") center/contain no-repeat;
+        vertical-align: middle;
+        opacity: 0.6;
+    }
     .stTabs [aria-selected="true"]::before {
         filter: invert(1);
         opacity: 1;
@@ -256,171 +281,225 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 
-@st.cache_data
+# Paramètre de filter_data -> clé du widget de la barre latérale
+FILTER_KEYS = {
+    'search_commune': 'search_commune',
+    'selected_depts': 'filter_depts',
+    'pop_range': 'filter_pop',
+    'eur_range': 'filter_eur',
+    'frais_range': 'filter_frais',
+    'ratio_range': 'filter_ratio',
+    'coul_selection': 'filter_coul',
+}
+
+
 def load_data():
-    """Charge et prépare les données"""
-    df = pd.read_csv(
-        "data/donnees_analyse.csv",
-        dtype={'CODE_COMMUNE': str, 'DEPARTEMENT': str},
-        na_values=['#N/D', '#N/A', 'N/A', '', ' ']
-    )
+    """Charge et prépare les données (instantané partagé par toutes les sessions)"""
+    # Sans serve.py (ex. `streamlit run app.py`), le préchauffage démarre ici
+    warmup.start()
+    df = load_dataset()
+    # Contrôle qualité (une fois par instantané, résultat partagé)
+    validate_dataset(df)
+    return df
 
-    # Nettoyage des colonnes numériques (virgule -> point)
-    numeric_cols = ['FRAIS_REPRESENTATION', 'EUR_PAR_HAB', 'TOTAL_CHARGES',
-                    'CHARGES_PERSONNEL', 'ACHATS_SERVICES', 'CHARGES_FINANCIERES',
-                    'CHARGES_EXCEPT', 'AUTRES_CHARGES_GESTION', 'RATIO_FRAIS_REP']
-    for col in numeric_cols:
-        if col in df.columns:
-            if df[col].dtype == 'object':
-                df[col] = df[col].astype(str).str.replace(',', '.').str.replace(' ', '')
-                df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
-            else:
-                df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
-
-    # Nettoyage population
-    df['POP_2022'] = pd.to_numeric(
-        df['POP_2022'].astype(str).str.replace(' ', '').str.replace(',', '.'),
-        errors='coerce'
-    ).fillna(0).astype(int)
-
-    # Nettoyage coordonnées (convertir en numérique, remplacer invalides par NaN)
-    for col in ['LATITUDE', 'LONGITUDE']:
-        df[col] = pd.to_numeric(
-            df[col].astype(str).str.replace(',', '.'),
-            errors='coerce'
+
+def render_data_quality(df):
+    """Rapport de qualité des données et lignes signalées"""
+    report, flagged = validate_dataset(df)
+    n_errors = int(report.loc[report['Gravité'] == 'erreur', 'Lignes'].sum())
+    n_warnings = int(report.loc[report['Gravité'] == 'avertissement', 'Lignes'].sum())
+
+    with st.expander(f"Qualité des données — {fmt_fr(len(flagged))} ligne(s) signalée(s)", expanded=False):
+        st.caption(
+            f"{fmt_fr(len(report))} règles contrôlées sur {fmt_fr(len(df))} lignes : "
+            f"{fmt_fr(n_errors)} infraction(s) de type erreur, {fmt_fr(n_warnings)} avertissement(s). "
+            "Les lignes signalées restent dans l'analyse."
         )
+        st.dataframe(report, use_container_width=True, hide_index=True)
+
+        if len(flagged):
+            failing = report.loc[report['Lignes'] > 0, 'Règle'].tolist()
+            rules = st.multiselect("Règles", failing, default=failing, key="quality_rules")
+            mask = flagged['ANOMALIES'].str.split(', ').apply(lambda names: bool(set(names) & set(rules)))
+            st.dataframe(flagged[mask.to_numpy()], use_container_width=True, hide_index=True)
+
+
+def render_cache_admin(df, df_filtered):
+    """Vue d'administration du cache, visible avec ?admin=<ADMIN_TOKEN>"""
+    token = os.environ.get('ADMIN_TOKEN')
+    if not token or st.query_params.get('admin') != token:
+        return
+
+    with st.sidebar.expander("Administration du cache", expanded=False):
+        stats = cache_manager.stats()
+        st.caption(f"Mémoire totale : {fmt_fr(stats['Mémoire (Mo)'].sum(), 2)} Mo")
+        dataset_mb = memory_report(df).loc['TOTAL', 'octets'] / 1024 ** 2
+        session_mb = dataset_mb + memory_report(df_filtered).loc['TOTAL', 'octets'] / 1024 ** 2
+        st.caption(f"Jeu de données : {fmt_fr(dataset_mb, 2)} Mo — par session : {fmt_fr(session_mb, 2)} Mo")
+        st.dataframe(stats, use_container_width=True, hide_index=True)
+        if cache_manager.store is not None:
+            store = cache_manager.store.stats()
+            st.caption(
+                f"Magasin partagé ({store['Répertoire']}) : {fmt_fr(store['Disque (Mo)'], 2)} Mo, "
+                f"{store['Constructions']} construction(s), {store['Lectures']} lecture(s) dans ce processus"
+            )
+        if st.button("Vider le cache"):
+            cache_manager.clear()
+            st.rerun()
 
-    # Nettoyage couleur politique
-    df['COUL_POL'] = df['COUL_POL'].fillna('Non classé')
-    df['COUL_POL'] = df['COUL_POL'].replace('', 'Non classé')
-    df['COUL_POL'] = df['COUL_POL'].replace('#N/D', 'Non classé')
 
-    # Catégories de population
-    df['CATEGORIE_POP'] = pd.cut(
-        df['POP_2022'],
-        bins=[0, 500, 2000, 10000, 50000, float('inf')],
-        labels=['< 500 hab', '500-2000', '2000-10000', '10000-50000', '> 50000']
+def render_similar_communes(df, df_filtered):
+    """Communes comparables (population, structure des charges) et leurs frais de représentation"""
+    st.markdown('<h4><i class="iconoir-git-compare"></i> Communes similaires</h4>', unsafe_allow_html=True)
+    st.caption(
+        "Plus proches voisines parmi toutes les communes : population (échelle log) et part de chaque "
+        "poste (personnel, achats, financières, exceptionnelles, autres) dans les charges totales."
     )
 
-    return df
-
+    # Communes de la sélection présentes dans l'index (charges totales positives)
+    index = similarity_index(df)
+    positions = df.index.get_indexer(df_filtered.index)
+    positions = positions[index.row_of[positions] >= 0]
+    if not len(positions):
+        st.info("Aucune commune de la sélection n'a de charges totales renseignées.")
+        return
+
+    names = df['NOM_COMMUNE'].to_numpy(dtype=object)
+    depts = df['DEPARTEMENT'].to_numpy(dtype=object)
+    col_s1, col_s2 = st.columns([3, 1])
+    with col_s1:
+        position = st.selectbox(
+            "Commune de référence",
+            positions.tolist(),
+            format_func=lambda p: f"{names[p]} ({depts[p]})",
+            key="similar_commune"
+        )
+    with col_s2:
+        k = st.selectbox("Nombre de voisines", [5, 10, 20, 50], index=1, key="similar_k")
+
+    similar = similar_communes(df, position, k, include_reference=True)
+    reference, neighbors = similar.iloc[0], similar.iloc[1:]
+    frais_median = neighbors['FRAIS_REPRESENTATION'].median()
+    eur_median = neighbors['EUR_PAR_HAB'].median()
+    rank = int((neighbors['FRAIS_REPRESENTATION'] > reference['FRAIS_REPRESENTATION']).sum()) + 1
+
+    col_m1, col_m2, col_m3 = st.columns(3)
+    with col_m1:
+        st.metric(
+            "Frais de représentation",
+            f"{fmt_fr(reference['FRAIS_REPRESENTATION'])} €",
+            delta=f"{fmt_fr(reference['FRAIS_REPRESENTATION'] - frais_median)} € vs médiane des voisines",
+            delta_color="inverse"
+        )
+    with col_m2:
+        st.metric(
+            "EUR par habitant",
+            f"{fmt_fr(reference['EUR_PAR_HAB'], 2)} €",
+            delta=f"{fmt_fr(reference['EUR_PAR_HAB'] - eur_median, 2)} € vs médiane des voisines",
+            delta_color="inverse"
+        )
+    with col_m3:
+        st.metric("Rang (frais, décroissant)", f"{rank} / {len(similar)}")
+
+    table = pd.DataFrame({
+        'Commune': similar['NOM_COMMUNE'].to_numpy(dtype=object),
+        'Dépt': similar['DEPARTEMENT'].to_numpy(dtype=object),
+        'Pop.': similar['POP_2022'].apply(lambda x: fmt_fr(x)).to_numpy(),
+    })
+    for col, label in SHARE_COLS.items():
+        table[f'{label} (%)'] = similar[f'PART_{col}'].apply(lambda x: fmt_fr(x, 1)).to_numpy()
+    table['Frais (€)'] = similar['FRAIS_REPRESENTATION'].apply(lambda x: fmt_fr(x, 2)).to_numpy()
+    table['EUR/hab'] = similar['EUR_PAR_HAB'].apply(lambda x: fmt_fr(x, 2)).to_numpy()
+    table['Distance'] = similar['DISTANCE'].apply(lambda x: fmt_fr(x, 2)).to_numpy()
+    st.dataframe(table, use_container_width=True, hide_index=True)
+    st.caption("Première ligne : commune de référence. Distance sur les indicateurs standardisés.")
+
+
+def render_map_preview(df_filtered, color_by):
+    """Aperçu de la carte : points colorés comme les marqueurs, sans popups (un seul élément)"""
+    points = map_preview(df_filtered, color_by)
+    st.map(points, latitude='lat', longitude='lon', color='color', size=800, height=500)
+
+
+def render_budget(budget_figures, preview=False):
+    """Onglet Budget : figures Plotly, ou graphiques natifs de l'aperçu (budget_preview)"""
+    budget_metrics = budget_figures['metrics']
+
+    # Métriques budget
+    col_b1, col_b2, col_b3, col_b4 = st.columns(4)
+    with col_b1:
+        st.metric("Total charges", f"{fmt_fr(budget_metrics['total_charges'] / 1e9, 2)} Mds €")
+    with col_b2:
+        st.metric("Charges personnel", f"{fmt_fr(budget_metrics['total_personnel'] / 1e9, 2)} Mds €")
+    with col_b3:
+        st.metric("Ratio frais rep. moyen", f"{fmt_fr(budget_metrics['ratio_moy'], 3)} %")
+    with col_b4:
+        st.metric("Ratio frais rep. max", f"{fmt_fr(budget_metrics['ratio_max'], 2)} %")
 
-def create_map(df_filtered, color_by='EUR_PAR_HAB'):
-    """Crée la carte Folium interactive"""
+    st.markdown("---")
 
-    # Centre de la France
-    m = folium.Map(
-        location=[46.603354, 1.888334],
-        zoom_start=6,
-        tiles='cartodbpositron'
-    )
+    col_bg1, col_bg2 = st.columns(2)
 
-    # Taille fixe des marqueurs
-    MARKER_RADIUS = 6
+    with col_bg1:
+        # Répartition des charges (top 10 communes)
+        st.markdown("#### Répartition des charges (Top 10 communes)")
+        if preview:
+            st.bar_chart(budget_figures['stack'], x='Commune', y_label="Millions €")
+        else:
+            st.plotly_chart(budget_figures['stack'], use_container_width=True)
 
-    # Palette de couleurs selon le critère
-    if color_by in ['EUR_PAR_HAB', 'FRAIS_REPRESENTATION', 'RATIO_FRAIS_REP']:
-        # Échelle de couleurs pour la valeur choisie
-        if color_by == 'RATIO_FRAIS_REP':
-            # Pour le ratio, on exclut les 0 du calcul du percentile
-            max_val = df_filtered[df_filtered[color_by] > 0][color_by].quantile(0.95)
+    with col_bg2:
+        # Scatter : Charges totales vs Frais de représentation
+        st.markdown("#### Charges totales vs Frais de représentation")
+        if preview:
+            st.scatter_chart(budget_figures['scatter'], x='log10 charges (€)', y='log10 frais (€)', color='Politique')
         else:
-            max_val = df_filtered[color_by].quantile(0.95)  # Cap à 95e percentile
+            st.plotly_chart(budget_figures['scatter'], use_container_width=True)
 
-        for _, row in df_filtered.iterrows():
-            # Vérifier que les coordonnées sont valides (numériques et dans les bornes)
-            try:
-                lat = float(row['LATITUDE'])
-                lon = float(row['LONGITUDE'])
-                if not (-90 <= lat <= 90 and -180 <= lon <= 180):
-                    continue
-            except (ValueError, TypeError):
-                continue
-
-            # Couleur selon la valeur (vert -> orange -> rouge)
-            ratio = min(row[color_by] / max_val, 1) if max_val > 0 else 0
-            if ratio < 0.33:
-                color = '#2ecc71'  # Vert
-            elif ratio < 0.66:
-                color = '#f39c12'  # Orange
-            else:
-                color = '#e74c3c'  # Rouge
+    # Distribution du ratio frais de représentation
+    st.markdown("#### Distribution du ratio frais de représentation / charges totales")
+    if preview:
+        st.bar_chart(budget_figures['ratio'], x='Ratio (%)', y='Nombre de communes')
+    else:
+        st.plotly_chart(budget_figures['ratio'], use_container_width=True)
 
-            # Tooltip selon le mode
-            if color_by == 'EUR_PAR_HAB':
-                tooltip_text = f"{row['NOM_COMMUNE']}: {fmt_fr(row['EUR_PAR_HAB'], 2)} €/hab"
-            elif color_by == 'RATIO_FRAIS_REP':
-                tooltip_text = f"{row['NOM_COMMUNE']}: {fmt_fr(row['RATIO_FRAIS_REP'], 2)} %"
-            else:
-                tooltip_text = f"{row['NOM_COMMUNE']}: {fmt_fr(row['FRAIS_REPRESENTATION'])} €"
-
-            popup_html = f"""
-            <b>{row['NOM_COMMUNE']}</b><br>
-            Département: {row['DEPARTEMENT']}<br>
-            Population: {fmt_fr(row['POP_2022'])}<br>
-            Frais: {fmt_fr(row['FRAIS_REPRESENTATION'], 2)} €<br>
-            EUR/hab: {fmt_fr(row['EUR_PAR_HAB'], 2)} €<br>
-            Ratio: {fmt_fr(row.get('RATIO_FRAIS_REP', 0), 2)} %<br>
-            Politique: {row['COUL_POL']}
-            """
-
-            folium.CircleMarker(
-                location=[lat, lon],
-                radius=MARKER_RADIUS,
-                color=color,
-                fill=True,
-                fillColor=color,
-                fillOpacity=0.7,
-                popup=folium.Popup(popup_html, max_width=300),
-                tooltip=tooltip_text
-            ).add_to(m)
-
-    else:  # Couleur politique
-        color_map = {
-            'Gauche': '#e74c3c',
-            'Droite': '#3498db',
-            'Centre': '#f39c12',
-            'Extrême droite': '#1a1a2e',
-            'Courants politiques divers': '#9b59b6',
-            'Non classé': '#95a5a6',
-                    }
-
-        for _, row in df_filtered.iterrows():
-            # Vérifier que les coordonnées sont valides
-            try:
-                lat = float(row['LATITUDE'])
-                lon = float(row['LONGITUDE'])
-                if not (-90 <= lat <= 90 and -180 <= lon <= 180):
-                    continue
-            except (ValueError, TypeError):
-                continue
-
-            color = color_map.get(row['COUL_POL'], '#95a5a6')
-
-            popup_html = f"""
-            <b>{row['NOM_COMMUNE']}</b><br>
-            Département: {row['DEPARTEMENT']}<br>
-            Population: {fmt_fr(row['POP_2022'])}<br>
-            Frais: {fmt_fr(row['FRAIS_REPRESENTATION'], 2)} €<br>
-            EUR/hab: {fmt_fr(row['EUR_PAR_HAB'], 2)} €<br>
-            <b>Politique: {row['COUL_POL']}</b>
-            """
-
-            folium.CircleMarker(
-                location=[lat, lon],
-                radius=MARKER_RADIUS,
-                color=color,
-                fill=True,
-                fillColor=color,
-                fillOpacity=0.7,
-                popup=folium.Popup(popup_html, max_width=300),
-                tooltip=f"{row['NOM_COMMUNE']}: {row['COUL_POL']}"
-            ).add_to(m)
-
-    return m
+    # Top communes par ratio
+    st.markdown("#### Top 20 communes avec le plus haut ratio frais de représentation")
+    top_ratio = budget_figures['top_ratio']
+    st.dataframe(top_ratio, use_container_width=True, hide_index=True)
+
+
+def render_sources():
+    """Pied de page : sources des données"""
+    st.markdown("---")
+    footer_html = """<div class="sources-container">
+<div class="sources-title"><i class="iconoir-book"></i> Sources des données</div>
+<div class="source-item">
+<div class="source-title"><i class="iconoir-coins"></i> Frais de représentation des maires</div>
+<div class="source-desc">Balances comptables des communes 2024 — Compte 65316<br>
+<a href="https://www.data.gouv.fr/datasets/balances-comptables-des-communes-en-2024/" target="_blank">data.gouv.fr → balances-comptables-communes-2024</a></div>
+</div>
+<div class="source-item">
+<div class="source-title"><i class="iconoir-community"></i> Étiquette politique du maire</div>
+<div class="source-desc">Nuance politique — Résultats des élections municipales<br>
+<a href="https://www.data.gouv.fr/datasets/communes-enrichies-avec-la-nuance-politique-france/" target="_blank">data.gouv.fr → communes-nuance-politique</a></div>
+</div>
+<div class="source-item">
+<div class="source-title"><i class="iconoir-group"></i> Population des communes</div>
+<div class="source-desc">Recensement de la population 2022<br>
+<a href="https://www.insee.fr/fr/statistiques/8581696" target="_blank">insee.fr → statistiques/8581696</a></div>
+</div>
+<div style="text-align: center; margin-top: 1rem; padding-top: 0.75rem; border-top: 1px solid #eee; color: #999; font-size: 0.75rem;">
+Réalisé par <strong style="color: #666;">Degun</strong> — <a href="https://manufacture-osint.fr" target="_blank" style="color: #888;">Manufacture Française d'OSINT</a>
+</div>
+</div>"""
+    st.markdown(footer_html, unsafe_allow_html=True)
 
 
 def main():
+    # Budget de latence des aperçus compté depuis le début de l'exécution
+    progress = ProgressiveRenderer()
+
     # Header
     st.markdown('<h1 class="main-header"><i class="iconoir-city"></i> Frais de représentation des maires</h1>', unsafe_allow_html=True)
     st.markdown('<p class="sub-header">Analyse des dépenses en frais de representation par commune en ayant déclaré sur leur budget 2024</p>', unsafe_allow_html=True)
@@ -517,10 +596,42 @@ Dans le fichier des balances comptables, il a fallu reconstituer le code INSEE 
 
     # Chargement des données
     df = load_data()
+    render_data_quality(df)
 
     # Sidebar - Filtres
     st.sidebar.header("Filtres")
 
+    # Valeurs initiales des filtres : lien partagé (paramètres d'URL) ou défauts
+    facets = dataset_facets(df)
+    if 'filters_initialized' not in st.session_state:
+        initial = decode(st.query_params, facets)
+        st.session_state['search_commune'] = initial['search_commune']
+        st.session_state['filter_depts'] = initial['selected_depts']
+        st.session_state['filter_pop'] = initial['pop_range']
+        st.session_state['filter_eur'] = initial['eur_range']
+        st.session_state['filter_frais'] = initial['frais_range']
+        st.session_state['filter_ratio'] = initial['ratio_range']
+        st.session_state['filter_coul'] = initial['coul_selection']
+        st.session_state['filters_initialized'] = True
+
+    # Mode navigateur : données envoyées une fois, filtres appliqués localement
+    client_mode = st.sidebar.toggle(
+        "Filtrage dans le navigateur",
+        key="client_mode",
+        help="Envoie le jeu de données compressé au navigateur : filtres, chiffres clés et tableau "
+             "sont recalculés localement, sans aller-retour vers le serveur (carte et graphiques masqués)."
+    )
+    if client_mode:
+        # Widgets non affichés : leurs valeurs sont conservées pour le retour au mode serveur
+        for key in FILTER_KEYS.values():
+            st.session_state[key] = st.session_state[key]
+        filters = {param: st.session_state[key] for param, key in FILTER_KEYS.items()}
+        st.sidebar.caption("Les filtres sont affichés au-dessus du tableau et appliqués par le navigateur.")
+        st.markdown('<h3><i class="iconoir-stats-report"></i> Chiffres clés</h3>', unsafe_allow_html=True)
+        render_client_view(df, filters, facets)
+        render_sources()
+        return
+
     # Recherche par nom
     search_commune = st.sidebar.text_input(
         "Rechercher une commune",
@@ -529,39 +640,39 @@ Dans le fichier des balances comptables, il a fallu reconstituer le code INSEE 
     )
 
     # Filtre département(s)
-    depts_disponibles = sorted(df['DEPARTEMENT'].dropna().unique().tolist())
+    depts_disponibles = facets['depts']
     selected_depts = st.sidebar.multiselect(
         "Département(s)",
         options=depts_disponibles,
-        default=[],
-        placeholder="Tous les départements"
+        placeholder="Tous les départements",
+        key="filter_depts"
     )
 
     # Filtre population
     pop_min, pop_max = st.sidebar.slider(
         "Population",
         min_value=0,
-        max_value=int(df['POP_2022'].max()),
-        value=(0, int(df['POP_2022'].max())),
-        step=100
+        max_value=facets['pop_max'],
+        step=100,
+        key="filter_pop"
     )
 
     # Filtre EUR/hab
     eur_min, eur_max = st.sidebar.slider(
         "EUR par habitant",
         min_value=0.0,
-        max_value=float(df['EUR_PAR_HAB'].max()),
-        value=(0.0, float(df['EUR_PAR_HAB'].max())),
-        step=0.1
+        max_value=facets['eur_max'],
+        step=0.1,
+        key="filter_eur"
     )
 
     # Filtre Frais totaux
     frais_min, frais_max = st.sidebar.slider(
         "Frais totaux (€)",
         min_value=0.0,
-        max_value=float(df['FRAIS_REPRESENTATION'].max()),
-        value=(0.0, float(df['FRAIS_REPRESENTATION'].max())),
-        step=100.0
+        max_value=facets['frais_max'],
+        step=100.0,
+        key="filter_frais"
     )
 
     # Filtre Ratio budget
@@ -569,9 +680,9 @@ Dans le fichier des balances comptables, il a fallu reconstituer le code INSEE 
         ratio_min, ratio_max = st.sidebar.slider(
             "Ratio budget (%)",
             min_value=0.0,
-            max_value=float(df['RATIO_FRAIS_REP'].max()),
-            value=(0.0, float(df['RATIO_FRAIS_REP'].max())),
-            step=0.01
+            max_value=facets['ratio_max'],
+            step=0.01,
+            key="filter_ratio"
         )
     else:
         ratio_min, ratio_max = 0.0, 100.0
@@ -579,34 +690,33 @@ Dans le fichier des balances comptables, il a fallu reconstituer le code INSEE 
     # Filtre couleur politique
     coul_selection = st.sidebar.multiselect(
         "Couleur politique",
-        options=df['COUL_POL'].unique().tolist(),
-        default=df['COUL_POL'].unique().tolist()
+        options=facets['coul_pol'],
+        key="filter_coul"
     )
+    st.sidebar.caption("L'adresse de la page reflète ces filtres : copiez-la pour partager la vue.")
 
     # Application des filtres
-    df_filtered = df.copy()
-
-    if search_commune:
-        df_filtered = df_filtered[df_filtered['NOM_COMMUNE'].str.contains(search_commune, case=False, na=False)]
-
-    if selected_depts:
-        df_filtered = df_filtered[df_filtered['DEPARTEMENT'].isin(selected_depts)]
-
-    df_filtered = df_filtered[
-        (df_filtered['POP_2022'] >= pop_min) &
-        (df_filtered['POP_2022'] <= pop_max) &
-        (df_filtered['EUR_PAR_HAB'] >= eur_min) &
-        (df_filtered['EUR_PAR_HAB'] <= eur_max) &
-        (df_filtered['FRAIS_REPRESENTATION'] >= frais_min) &
-        (df_filtered['FRAIS_REPRESENTATION'] <= frais_max) &
-        (df_filtered['COUL_POL'].isin(coul_selection))
-    ]
-
-    if 'RATIO_FRAIS_REP' in df_filtered.columns:
-        df_filtered = df_filtered[
-            (df_filtered['RATIO_FRAIS_REP'] >= ratio_min) &
-            (df_filtered['RATIO_FRAIS_REP'] <= ratio_max)
-        ]
+    filters = {
+        'search_commune': search_commune,
+        'selected_depts': selected_depts,
+        'pop_range': (pop_min, pop_max),
+        'eur_range': (eur_min, eur_max),
+        'frais_range': (frais_min, frais_max),
+        'ratio_range': (ratio_min, ratio_max),
+        'coul_selection': coul_selection,
+    }
+    df_filtered = cached_selection(df, filters)
+
+    # État des filtres reflété dans l'URL (lien partageable)
+    url_params = encode(filters, facets)
+    for param in PARAMS:
+        if param in url_params:
+            if st.query_params.get(param) != url_params[param]:
+                st.query_params[param] = url_params[param]
+        elif param in st.query_params:
+            del st.query_params[param]
+
+    render_cache_admin(df, df_filtered)
 
     # Métriques clés
     st.markdown('<h3><i class="iconoir-stats-report"></i> Chiffres clés</h3>', unsafe_allow_html=True)
@@ -623,10 +733,11 @@ Dans le fichier des balances comptables, il a fallu reconstituer le code INSEE 
     with col5:
         st.metric("Max EUR/hab", f"{fmt_fr(df_filtered['EUR_PAR_HAB'].max(), 2)} €")
 
+    progress.place_indicator()
     st.markdown("---")
 
     # Onglets principaux
-    tab1, tab2, tab3, tab4 = st.tabs(["Carte", "Tableau", "Palmarès", "Budget"])
+    tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs(["Carte", "Tableau", "Palmarès", "Budget", "Tableau croisé", "SQL"])
 
     # TAB 1 - CARTE
     with tab1:
@@ -701,8 +812,12 @@ Dans le fichier des balances comptables, il a fallu reconstituer le code INSEE 
                 color_by = 'RATIO_FRAIS_REP'
             else:
                 color_by = 'COUL_POL'
-            m = create_map(df_filtered, color_by=color_by)
-            st_folium(m, width=800, height=500)
+            progress.view(
+                "carte",
+                lambda: create_map(df_filtered, color_by=color_by),
+                lambda html: components.html(html, height=500),
+                lambda: render_map_preview(df_filtered, color_by),
+            )
 
     # TAB 2 - TABLEAU
     with tab2:
@@ -761,22 +876,38 @@ Dans le fichier des balances comptables, il a fallu reconstituer le code INSEE 
             column_config['Charges tot. (€)'] = st.column_config.NumberColumn(format="%.0f €")
             column_config['Ratio (%)'] = st.column_config.NumberColumn(format="%.3f %%")
 
-        st.dataframe(
-            df_display,
-            use_container_width=True,
-            height=500,
-            hide_index=True,
-            column_config=column_config
-        )
+        def render_table(rows=None):
+            st.dataframe(
+                df_display if rows is None else df_display.head(rows),
+                use_container_width=True,
+                height=500,
+                hide_index=True,
+                column_config=column_config
+            )
 
-        # Export CSV
-        csv = df_filtered.to_csv(index=False, sep=';', decimal=',')
-        st.download_button(
-            label="Télécharger les données filtrées (CSV)",
-            data=csv,
-            file_name="frais_representation_filtrees.csv",
-            mime="text/csv"
-        )
+        if len(df_display) > PREVIEW_ROWS:
+            progress.deferred("tableau", render_table, lambda: render_table(PREVIEW_ROWS))
+        else:
+            render_table()
+
+        # Export : fichier généré au clic (par morceaux), puis mis en cache pour la sélection
+        col_e1, col_e2 = st.columns([1, 2])
+        with col_e1:
+            export_fmt = st.selectbox(
+                "Format d'export",
+                available_formats(df_filtered),
+                format_func=lambda f: FORMATS[f][0],
+                key="export_format",
+                label_visibility="collapsed"
+            )
+        export_label, export_mime, export_ext = FORMATS[export_fmt]
+        with col_e2:
+            st.download_button(
+                label=f"Télécharger les données filtrées ({export_label})",
+                data=lambda: export_selection(df_filtered, export_fmt),
+                file_name=f"frais_representation_filtrees.{export_ext}",
+                mime=export_mime
+            )
 
     # TAB 3 - PALMARÈS
     with tab3:
@@ -829,7 +960,7 @@ Dans le fichier des balances comptables, il a fallu reconstituer le code INSEE 
 
         # Stats par couleur politique
         st.markdown('<h4><i class="iconoir-percentage"></i> Statistiques par couleur politique</h4>', unsafe_allow_html=True)
-        stats_pol = df_palmares.groupby('COUL_POL').agg({
+        stats_pol = df_palmares.groupby('COUL_POL', observed=True).agg({
             'EUR_PAR_HAB': ['mean', 'median', 'std'],
             'FRAIS_REPRESENTATION': 'sum',
             'NOM_COMMUNE': 'count'
@@ -844,6 +975,52 @@ Dans le fichier des balances comptables, il a fallu reconstituer le code INSEE 
         stats_pol['Nb communes'] = stats_pol['Nb communes'].apply(lambda x: fmt_fr(x))
         st.dataframe(stats_pol, use_container_width=True)
 
+        # Incertitude : intervalles de confiance bootstrap
+        st.markdown('<h4><i class="iconoir-ruler"></i> Intervalles de confiance (bootstrap)</h4>', unsafe_allow_html=True)
+        col_ci1, col_ci2, col_ci3 = st.columns(3)
+        with col_ci1:
+            n_resamples = st.selectbox("Rééchantillonnages", [1000, 2000, 5000, 10000], index=1, key="ci_resamples")
+        with col_ci2:
+            ci_col = st.selectbox(
+                "Indicateur",
+                ['EUR_PAR_HAB', 'RATIO_FRAIS_REP'],
+                format_func={'EUR_PAR_HAB': 'EUR par habitant', 'RATIO_FRAIS_REP': 'Ratio frais rep. (%)'}.get,
+                key="ci_col"
+            )
+        with col_ci3:
+            ci_stat = st.selectbox("Statistique comparée", list(STAT_LABELS), format_func=STAT_LABELS.get, key="ci_stat")
+
+        if len(df_palmares):
+            decimals = 2 if ci_col == 'EUR_PAR_HAB' else 3
+            intervals = party_intervals(df_palmares, n_resamples=n_resamples)
+            ci_table = pd.DataFrame({
+                'Couleur politique': intervals['COUL_POL'],
+                'Nb communes': intervals['n'].apply(lambda x: fmt_fr(x)),
+            })
+            for stat, label in STAT_LABELS.items():
+                ci_table[label] = intervals[(ci_col, stat)].apply(lambda x: fmt_fr(x, decimals))
+                ci_table[f'{label} IC 95 %'] = [
+                    f"[{fmt_fr(low, decimals)} ; {fmt_fr(high, decimals)}]"
+                    for low, high in zip(intervals[(ci_col, stat, 'low')], intervals[(ci_col, stat, 'high')])
+                ]
+            st.dataframe(ci_table, use_container_width=True, hide_index=True)
+            if (intervals['n'] < 30).any():
+                st.caption("Attention : les groupes de moins de 30 communes ont des intervalles très larges.")
+
+            tests = pairwise_tests(df_palmares, ci_col, ci_stat, n_resamples=n_resamples)
+            tests['Significatif (5 %)'] = np.where(tests['p-value (Holm)'] < 0.05, 'Oui', 'Non')
+            tests['Écart'] = tests['Écart'].apply(lambda x: fmt_fr(x, decimals))
+            tests['p-value'] = tests['p-value'].apply(lambda x: fmt_fr(x, 4))
+            tests['p-value (Holm)'] = tests['p-value (Holm)'].apply(lambda x: fmt_fr(x, 4))
+            st.markdown(f"**Comparaisons deux à deux — {STAT_LABELS[ci_stat].lower()}**")
+            st.dataframe(tests, use_container_width=True, hide_index=True)
+            st.caption(
+                f"IC percentile sur {fmt_fr(n_resamples)} rééchantillonnages ; p-values bilatérales "
+                "de l'écart bootstrap, corrigées pour comparaisons multiples (Holm)."
+            )
+
+        render_similar_communes(df, df_filtered)
+
     # TAB 4 - BUDGET
     with tab4:
         st.markdown('<h3><i class="iconoir-wallet"></i> Analyse budgétaire</h3>', unsafe_allow_html=True)
@@ -852,156 +1029,89 @@ Dans le fichier des balances comptables, il a fallu reconstituer le code INSEE 
         # Vérifier que les colonnes budget existent
         if 'TOTAL_CHARGES' in df_filtered.columns and df_filtered['TOTAL_CHARGES'].sum() > 0:
 
-            # Métriques budget
-            col_b1, col_b2, col_b3, col_b4 = st.columns(4)
-            with col_b1:
-                total_charges = df_filtered['TOTAL_CHARGES'].sum()
-                st.metric("Total charges", f"{fmt_fr(total_charges / 1e9, 2)} Mds €")
-            with col_b2:
-                total_personnel = df_filtered['CHARGES_PERSONNEL'].sum()
-                st.metric("Charges personnel", f"{fmt_fr(total_personnel / 1e9, 2)} Mds €")
-            with col_b3:
-                ratio_moy = df_filtered[df_filtered['RATIO_FRAIS_REP'] > 0]['RATIO_FRAIS_REP'].mean()
-                st.metric("Ratio frais rep. moyen", f"{fmt_fr(ratio_moy, 3)} %")
-            with col_b4:
-                ratio_max = df_filtered['RATIO_FRAIS_REP'].max()
-                st.metric("Ratio frais rep. max", f"{fmt_fr(ratio_max, 2)} %")
-
-            st.markdown("---")
-
-            col_bg1, col_bg2 = st.columns(2)
-
-            with col_bg1:
-                # Répartition des charges (top 10 communes)
-                st.markdown("#### Répartition des charges (Top 10 communes)")
-                top10_budget = df_filtered.nlargest(10, 'TOTAL_CHARGES')
-
-                # Préparer les données pour le graphique empilé
-                budget_data = []
-                for _, row in top10_budget.iterrows():
-                    budget_data.append({
-                        'Commune': row['NOM_COMMUNE'][:15],
-                        'Personnel': row['CHARGES_PERSONNEL'] / 1e6,
-                        'Achats/Services': row['ACHATS_SERVICES'] / 1e6,
-                        'Autres gestion': row['AUTRES_CHARGES_GESTION'] / 1e6,
-                        'Financières': row['CHARGES_FINANCIERES'] / 1e6,
-                        'Exceptionnelles': row['CHARGES_EXCEPT'] / 1e6
-                    })
-
-                df_budget = pd.DataFrame(budget_data)
-                fig_budget = px.bar(
-                    df_budget,
-                    x='Commune',
-                    y=['Personnel', 'Achats/Services', 'Autres gestion', 'Financières', 'Exceptionnelles'],
-                    title="",
-                    labels={'value': 'Millions €', 'variable': 'Type de charge'},
-                    color_discrete_sequence=['#3498db', '#2ecc71', '#f39c12', '#e74c3c', '#9b59b6']
-                )
-                fig_budget.update_layout(
-                    xaxis_title="",
-                    yaxis_title="Millions €",
-                    legend_title="",
-                    barmode='stack',
-                    separators=", "
-                )
-                st.plotly_chart(fig_budget, use_container_width=True)
-
-            with col_bg2:
-                # Scatter : Charges totales vs Frais de représentation
-                st.markdown("#### Charges totales vs Frais de représentation")
-                fig_scatter_budget = px.scatter(
-                    df_filtered[df_filtered['TOTAL_CHARGES'] > 0],
-                    x='TOTAL_CHARGES',
-                    y='FRAIS_REPRESENTATION',
-                    color='COUL_POL',
-                    hover_name='NOM_COMMUNE',
-                    hover_data=['POP_2022', 'RATIO_FRAIS_REP'],
-                    opacity=0.6,
-                    color_discrete_map={
-                        'Gauche': '#e74c3c',
-                        'Droite': '#3498db',
-                        'Centre': '#f39c12',
-                        'Extrême droite': '#1a1a2e',
-                        'Courants politiques divers': '#9b59b6',
-                        'Non classé': '#95a5a6',
-                    }
-                )
-                fig_scatter_budget.update_layout(
-                    xaxis_title="Charges totales (€)",
-                    yaxis_title="Frais de représentation (€)",
-                    xaxis_type="log",
-                    yaxis_type="log",
-                    separators=", "
-                )
-                st.plotly_chart(fig_scatter_budget, use_container_width=True)
-
-            # Distribution du ratio frais de représentation
-            st.markdown("#### Distribution du ratio frais de représentation / charges totales")
-            df_ratio = df_filtered[df_filtered['RATIO_FRAIS_REP'] > 0].copy()
-            df_ratio['RATIO_PERCENT'] = df_ratio['RATIO_FRAIS_REP']
-
-            fig_ratio = px.histogram(
-                df_ratio,
-                x='RATIO_PERCENT',
-                nbins=50,
-                color='COUL_POL',
-                marginal='box',
-                color_discrete_map={
-                    'Gauche': '#e74c3c',
-                    'Droite': '#3498db',
-                    'Centre': '#f39c12',
-                    'Extrême droite': '#1a1a2e',
-                    'Courants politiques divers': '#9b59b6',
-                    'Non classé': '#95a5a6',
-                }
+            # Métriques, figures et table : construites ensemble, en cache par sélection ;
+            # aperçu sans Plotly si elles ne sont pas prêtes dans le budget de latence
+            progress.view(
+                "graphiques Budget",
+                lambda: build_budget_figures(df_filtered),
+                render_budget,
+                lambda: render_budget(budget_preview(df_filtered), preview=True),
             )
-            fig_ratio.update_layout(
-                xaxis_title="Ratio frais représentation / charges totales (%)",
-                yaxis_title="Nombre de communes",
-                separators=", "
-            )
-            st.plotly_chart(fig_ratio, use_container_width=True)
-
-            # Top communes par ratio
-            st.markdown("#### Top 20 communes avec le plus haut ratio frais de représentation")
-            top_ratio = df_filtered[df_filtered['RATIO_FRAIS_REP'] > 0].nlargest(20, 'RATIO_FRAIS_REP')[
-                ['NOM_COMMUNE', 'DEPARTEMENT', 'POP_2022', 'FRAIS_REPRESENTATION',
-                 'TOTAL_CHARGES', 'RATIO_FRAIS_REP', 'COUL_POL']
-            ].reset_index(drop=True)
-            top_ratio.columns = ['Commune', 'Dépt', 'Pop.', 'Frais rep. (€)', 'Charges totales (€)', 'Ratio (%)', 'Politique']
-            top_ratio['Pop.'] = top_ratio['Pop.'].apply(lambda x: fmt_fr(x))
-            top_ratio['Frais rep. (€)'] = top_ratio['Frais rep. (€)'].apply(lambda x: fmt_fr(x, 2))
-            top_ratio['Charges totales (€)'] = top_ratio['Charges totales (€)'].apply(lambda x: fmt_fr(x))
-            top_ratio['Ratio (%)'] = top_ratio['Ratio (%)'].apply(lambda x: fmt_fr(x, 3))
-            st.dataframe(top_ratio, use_container_width=True, hide_index=True)
 
         else:
             st.warning("Les données budgétaires ne sont pas disponibles pour cette sélection.")
 
+    # TAB 5 - TABLEAU CROISÉ
+    with tab5:
+        st.markdown('<h3><i class="iconoir-table"></i> Tableau croisé</h3>', unsafe_allow_html=True)
+        st.markdown("Agrégats pondérés par département, couleur politique et catégorie de population")
+
+        col_c1, col_c2, col_c3 = st.columns(3)
+        with col_c1:
+            pivot_rows = st.selectbox("Lignes", DIMS, index=1, format_func=DIM_LABELS.get, key="pivot_rows")
+        with col_c2:
+            pivot_cols = st.selectbox(
+                "Colonnes",
+                [None] + [d for d in DIMS if d != pivot_rows],
+                index=0,
+                format_func=lambda d: 'Aucune' if d is None else DIM_LABELS[d],
+                key="pivot_cols"
+            )
+        with col_c3:
+            pivot_measure = st.selectbox(
+                "Mesure",
+                list(MEASURES),
+                format_func=lambda m: MEASURES[m][0],
+                key="pivot_measure"
+            )
+
+        cube = cube_for_selection(df, df_filtered, filters)
+        if len(cube):
+            table = pivot(cube, pivot_rows, pivot_cols, pivot_measure)
+            decimals = MEASURES[pivot_measure][2]
+            table = table.map(lambda x: fmt_fr(x, decimals) if pd.notna(x) else '')
+            st.dataframe(table, use_container_width=True)
+            st.caption(
+                "EUR/hab pondéré = total des frais / population totale ; "
+                "ratio = total des frais / total des charges. Les cellules vides n'ont aucune commune."
+            )
+        else:
+            st.warning("Aucune commune pour cette sélection.")
+
+    # TAB 6 - CONSOLE SQL
+    with tab6:
+        st.markdown('<h3><i class="iconoir-terminal"></i> Console SQL</h3>', unsafe_allow_html=True)
+        st.markdown(
+            f"Requêtes SELECT en lecture seule sur la table `{TABLE_NAME}` (jeu complet, sans les filtres "
+            f"de la barre latérale) — {fmt_fr(MAX_ROWS)} lignes et {fmt_fr(TIMEOUT_S)} s maximum."
+        )
+
+        with st.expander("Colonnes disponibles", expanded=False):
+            st.dataframe(
+                pd.DataFrame({'Colonne': df.columns, 'Type': df.dtypes.astype(str).values}),
+                use_container_width=True,
+                hide_index=True
+            )
+
+        sql_text = st.text_area("Requête", value=EXAMPLE_QUERY, height=220, key="sql_text")
+        if st.button("Exécuter", key="sql_run") or st.session_state.get('sql_last') == sql_text:
+            st.session_state['sql_last'] = sql_text
+            try:
+                result, truncated, duration, from_cache = run_query(df, sql_text)
+            except QueryError as exc:
+                st.error(str(exc))
+            else:
+                source = "cache" if from_cache else f"{fmt_fr(duration * 1000)} ms"
+                st.caption(f"{fmt_fr(len(result))} lignes — {source}")
+                if truncated:
+                    st.warning(f"Résultat tronqué aux {fmt_fr(MAX_ROWS)} premières lignes.")
+                st.dataframe(result, use_container_width=True, hide_index=True)
+
     # Footer avec sources
-    st.markdown("---")
-    footer_html = """<div class="sources-container">
-<div class="sources-title"><i class="iconoir-book"></i> Sources des données</div>
-<div class="source-item">
-<div class="source-title"><i class="iconoir-coins"></i> Frais de représentation des maires</div>
-<div class="source-desc">Balances comptables des communes 2024 — Compte 65316<br>
-<a href="https://www.data.gouv.fr/datasets/balances-comptables-des-communes-en-2024/" target="_blank">data.gouv.fr → balances-comptables-communes-2024</a></div>
-</div>
-<div class="source-item">
-<div class="source-title"><i class="iconoir-community"></i> Étiquette politique du maire</div>
-<div class="source-desc">Nuance politique — Résultats des élections municipales<br>
-<a href="https://www.data.gouv.fr/datasets/communes-enrichies-avec-la-nuance-politique-france/" target="_blank">data.gouv.fr → communes-nuance-politique</a></div>
-</div>
-<div class="source-item">
-<div class="source-title"><i class="iconoir-group"></i> Population des communes</div>
-<div class="source-desc">Recensement de la population 2022<br>
-<a href="https://www.insee.fr/fr/statistiques/8581696" target="_blank">insee.fr → statistiques/8581696</a></div>
-</div>
-<div style="text-align: center; margin-top: 1rem; padding-top: 0.75rem; border-top: 1px solid #eee; color: #999; font-size: 0.75rem;">
-Réalisé par <strong style="color: #666;">Degun</strong> — <a href="https://manufacture-osint.fr" target="_blank" style="color: #888;">Manufacture Française d'OSINT</a>
-</div>
-</div>"""
-    st.markdown(footer_html, unsafe_allow_html=True)
+    render_sources()
+
+    # Aperçus remplacés par les résultats complets
+    progress.finish()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,40 @@
+"""
+Durée des intervalles bootstrap et des comparaisons par couleur politique
+
+Usage : python -m benchmarks.bench_bootstrap [--rows 35000] [--resamples 10000]
+"""
+
+import argparse
+import os
+import time
+
+from bootstrap import STAT_LABELS, group_distributions, pairwise_tests, party_intervals
+from synthetic import make_synthetic
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=35000)
+    parser.add_argument('--resamples', type=int, default=10000)
+    args = parser.parse_args()
+
+    df = make_synthetic(args.rows)
+    print(f"{args.rows} communes, {args.resamples} rééchantillonnages, {os.cpu_count()} cœurs")
+
+    t0 = time.perf_counter()
+    party_intervals(df, n_resamples=args.resamples)
+    t1 = time.perf_counter()
+    for col in ('EUR_PAR_HAB', 'RATIO_FRAIS_REP'):
+        for stat in STAT_LABELS:
+            pairwise_tests(df, col, stat, n_resamples=args.resamples)
+    t2 = time.perf_counter()
+    group_distributions(df, n_resamples=args.resamples)
+    t3 = time.perf_counter()
+
+    print(f"IC (calcul)            : {(t1 - t0) * 1000:8.0f} ms")
+    print(f"Comparaisons (4 x 15)  : {(t2 - t1) * 1000:8.0f} ms")
+    print(f"Même filtre (cache)    : {(t3 - t2) * 1000:8.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""
+Temps de construction de l'onglet Budget sur des jeux synthétiques
+
+Mesure la construction à froid (métriques, figures, table des ratios,
+sérialisation JSON des figures comme le fait st.plotly_chart) puis le
+même rendu quand la sélection est déjà en cache.
+
+Usage : python -m benchmarks.bench_budget [--sizes 35000] [--repeat 7]
+"""
+
+import argparse
+import statistics
+import time
+
+import plotly.io as pio
+
+from cache import cache_manager
+from figures import build_budget_figures
+from synthetic import make_synthetic
+
+
+def render(df):
+    pieces = build_budget_figures(df)
+    for name in ('stack', 'scatter', 'ratio'):
+        pio.to_json(pieces[name], validate=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[35000])
+    parser.add_argument('--repeat', type=int, default=7)
+    args = parser.parse_args()
+
+    for n_rows in args.sizes:
+        df = make_synthetic(n_rows)
+        cold, warm = [], []
+        for _ in range(args.repeat):
+            cache_manager.namespace('figures').clear()
+            t0 = time.perf_counter()
+            render(df)
+            cold.append(time.perf_counter() - t0)
+            t0 = time.perf_counter()
+            render(df)
+            warm.append(time.perf_counter() - t0)
+        print(f"{n_rows:8d} lignes  à froid : {statistics.median(cold) * 1000:7.1f} ms"
+              f"  en cache : {statistics.median(warm) * 1000:7.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
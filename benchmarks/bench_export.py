@@ -0,0 +1,45 @@
+"""
+Durée et mémoire de travail des exports sur des jeux synthétiques
+
+La mémoire de travail est le pic tracemalloc pendant l'écriture dans un
+fichier temporaire (hors relecture du fichier produit).
+
+Usage : python -m benchmarks.bench_export [--sizes 35000 200000] [--formats csv parquet]
+"""
+
+import argparse
+import tempfile
+import time
+import tracemalloc
+
+from export import FORMATS, WRITERS, available_formats
+from synthetic import make_synthetic
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[35000, 200000])
+    parser.add_argument('--formats', nargs='+', default=list(FORMATS), choices=list(FORMATS))
+    args = parser.parse_args()
+
+    for n_rows in args.sizes:
+        df = make_synthetic(n_rows)
+        for fmt in args.formats:
+            if fmt not in available_formats(df):
+                continue
+            with tempfile.TemporaryFile() as f:
+                t0 = time.perf_counter()
+                WRITERS[fmt](df, f)
+                duration = time.perf_counter() - t0
+                size = f.tell()
+                f.seek(0)
+                tracemalloc.start()
+                WRITERS[fmt](df, f)
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+            print(f"{n_rows:8d} lignes  {fmt:8s} {duration:7.2f} s  {size / 1024 ** 2:7.1f} Mo"
+                  f"  pic mémoire : {peak / 1024 ** 2:6.1f} Mo")
+
+
+if __name__ == '__main__':
+    main()
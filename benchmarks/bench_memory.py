@@ -0,0 +1,79 @@
+"""
+Mémoire et vitesse de filtrage : schéma d'origine vs schéma compact
+
+Usage : python -m benchmarks.bench_memory [--sizes 35000 500000] [--repeat 20]
+"""
+
+import argparse
+import statistics
+import time
+
+import pandas as pd
+
+from data import filter_data, optimize_dtypes
+from synthetic import make_synthetic
+
+
+def legacy_filter(df, search, depts, coul):
+    """Filtrage tel qu'il était fait dans main() avant le schéma compact"""
+    df_filtered = df.copy()
+    if search:
+        df_filtered = df_filtered[df_filtered['NOM_COMMUNE'].str.contains(search, case=False, na=False)]
+    if depts:
+        df_filtered = df_filtered[df_filtered['DEPARTEMENT'].isin(depts)]
+    df_filtered = df_filtered[
+        (df_filtered['POP_2022'] >= 0) & (df_filtered['POP_2022'] <= 10 ** 7) &
+        (df_filtered['EUR_PAR_HAB'] >= 0.1) & (df_filtered['EUR_PAR_HAB'] <= 50) &
+        (df_filtered['FRAIS_REPRESENTATION'] >= 0) & (df_filtered['FRAIS_REPRESENTATION'] <= 10 ** 6) &
+        (df_filtered['COUL_POL'].isin(coul))
+    ]
+    return df_filtered[(df_filtered['RATIO_FRAIS_REP'] >= 0) & (df_filtered['RATIO_FRAIS_REP'] <= 100)]
+
+
+def compact_filter(df, search, depts, coul):
+    return filter_data(df, search, depts, (0, 10 ** 7), (0.1, 50), (0, 10 ** 6), (0, 100), coul)
+
+
+def timed(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - t0)
+    return statistics.median(samples) * 1000
+
+
+def mb(df):
+    return df.memory_usage(deep=True).sum() / 1024 ** 2
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[35000, 500000])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    rows = []
+    for n in args.sizes:
+        legacy = make_synthetic(n, compact=False)
+        compact = optimize_dtypes(legacy)
+        coul = legacy['COUL_POL'].unique().tolist()
+        scenarios = {
+            'défaut': ('', [], coul),
+            'recherche': ('saint', [], coul),
+            'départements': ('', ['13', '33', '69'], coul[:3]),
+        }
+        for label, (df, filt) in {'origine': (legacy, legacy_filter),
+                                  'compact': (compact, compact_filter)}.items():
+            row = {'lignes': n, 'schéma': label, 'total (Mo)': round(mb(df), 1)}
+            # Par session : la copie renvoyée par st.cache_data + la sélection par défaut
+            row['par session (Mo)'] = round(mb(df) + mb(filt(df, *scenarios['défaut'])), 1)
+            for name, params in scenarios.items():
+                row[f'filtre {name} (ms)'] = round(timed(lambda: filt(df, *params), args.repeat), 2)
+            rows.append(row)
+
+    print(pd.DataFrame(rows).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+Test de charge : pages vues par seconde à travers le proxy (ou une instance)
+
+Chaque utilisateur virtuel enchaîne des « pages vues » : ouverture d'une
+session Streamlit (WebSocket /_stcore/stream) avec une vue filtrée tirée au
+hasard dans l'URL, puis attente de la fin du script. Le débit est mesuré
+sur la durée du test, une fois les vues préchauffées.
+
+A lancer contre le profil compose « replicas » pour plusieurs valeurs de
+REPLICAS (1, 2, 4...) :
+
+    REPLICAS=2 docker compose --profile replicas up -d --build proxy
+    python -m benchmarks.bench_replicas --url http://localhost:8080 --users 16
+
+Usage : python -m benchmarks.bench_replicas [--url URL] [--users 8] [--duration 30]
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from tornado.httpclient import AsyncHTTPClient, HTTPRequest
+from tornado.websocket import websocket_connect
+
+# Vues filtrées (paramètres d'URL de url_state) visitées par les utilisateurs
+VIEWS = ['', 'd=75', 'd=13', 'd=69', 'd=33', 'd=59', 'pol=G', 'pol=D', 'pop=0_2000', 'd=13.83.84']
+
+
+async def page_view(base_url, query_string, timeout):
+    """Une page vue : nouvelle session, exécution complète du script ; retourne la durée"""
+    t0 = time.perf_counter()
+    # Cookie d'affinité posé par le proxy, renvoyé sur la WebSocket comme le ferait un navigateur
+    response = await AsyncHTTPClient().fetch(base_url + '/', raise_error=False)
+    cookies = '; '.join(c.split(';', 1)[0] for c in response.headers.get_list('Set-Cookie'))
+    ws_url = base_url.replace('http', 'ws', 1) + '/_stcore/stream'
+    request = HTTPRequest(ws_url, headers={'Cookie': cookies} if cookies else None)
+    conn = await websocket_connect(request, subprotocols=['streamlit'])
+    try:
+        msg = BackMsg()
+        msg.rerun_script.query_string = query_string
+        conn.write_message(msg.SerializeToString(), binary=True)
+        deadline = time.perf_counter() + timeout
+        while True:
+            data = await asyncio.wait_for(conn.read_message(), deadline - time.perf_counter())
+            if data is None:
+                raise ConnectionError("WebSocket fermée avant la fin du script")
+            forward = ForwardMsg()
+            forward.ParseFromString(data)
+            if forward.WhichOneof('type') == 'script_finished':
+                return time.perf_counter() - t0
+    finally:
+        conn.close()
+
+
+async def user(base_url, stop_at, latencies, errors, timeout, seed):
+    rng = random.Random(seed)
+    while time.perf_counter() < stop_at:
+        try:
+            latencies.append(await page_view(base_url, rng.choice(VIEWS), timeout))
+        except Exception as exc:
+            errors.append(repr(exc))
+
+
+async def run(base_url, users, duration, warmup, timeout):
+    # Préchauffage : chaque vue une fois (artefacts construits dans le magasin partagé)
+    for view in VIEWS[:warmup]:
+        await page_view(base_url, view, timeout)
+
+    latencies, errors = [], []
+    t0 = time.perf_counter()
+    await asyncio.gather(*(user(base_url, t0 + duration, latencies, errors, timeout, seed)
+                           for seed in range(users)))
+    elapsed = time.perf_counter() - t0
+    return latencies, errors, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://localhost:8080')
+    parser.add_argument('--users', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=30.0)
+    parser.add_argument('--warmup', type=int, default=len(VIEWS), help="nombre de vues préchauffées")
+    parser.add_argument('--timeout', type=float, default=120.0)
+    args = parser.parse_args()
+
+    latencies, errors, elapsed = asyncio.run(
+        run(args.url.rstrip('/'), args.users, args.duration, args.warmup, args.timeout)
+    )
+    print(f"{args.url}  {args.users} utilisateurs  {elapsed:.0f} s")
+    print(f"  pages vues : {len(latencies)}  ({len(latencies) / elapsed:.2f} /s)  erreurs : {len(errors)}")
+    if latencies:
+        p95 = statistics.quantiles(latencies, n=20)[-1] if len(latencies) > 1 else latencies[0]
+        print(f"  latence : médiane {statistics.median(latencies):.2f} s  p95 {p95:.2f} s")
+    for error in sorted(set(errors))[:5]:
+        print(f"  ! {error}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""
+Recherche de communes similaires : construction de l'index, requête unitaire, voisinage complet
+
+Usage : python -m benchmarks.bench_similarity [--sizes 35000 200000] [--k 10] [--queries 200]
+"""
+
+import argparse
+import statistics
+import time
+
+import numpy as np
+
+from similarity import SimilarityIndex
+from synthetic import make_synthetic
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[35000, 200000])
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--batch', type=int, default=5000, help="communes du voisinage en lot")
+    args = parser.parse_args()
+
+    for n_rows in args.sizes:
+        df = make_synthetic(n_rows)
+        t0 = time.perf_counter()
+        index = SimilarityIndex(df)
+        build = time.perf_counter() - t0
+
+        rng = np.random.default_rng(0)
+        timings = []
+        for position in rng.choice(index.positions, args.queries):
+            t0 = time.perf_counter()
+            index.neighbors(position, args.k)
+            timings.append((time.perf_counter() - t0) * 1000)
+
+        batch = index.positions[:args.batch]
+        t0 = time.perf_counter()
+        index.neighbors(batch, args.k)
+        batch_s = time.perf_counter() - t0
+
+        print(f"{n_rows:8d} lignes  index {build * 1000:7.1f} ms ({index.matrix.nbytes / 1024 ** 2:.1f} Mo)"
+              f"  requête médiane {statistics.median(timings):6.2f} ms  p95 {np.percentile(timings, 95):6.2f} ms"
+              f"  lot {len(batch)} communes {batch_s:6.2f} s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+"""
+Durée des requêtes de la console SQL sur un jeu synthétique
+
+Usage : python -m benchmarks.bench_sql [--rows 500000]
+"""
+
+import argparse
+import time
+
+from query import EXAMPLE_QUERY, run_query
+from synthetic import make_synthetic
+
+QUERIES = {
+    'ratio > 3 x médiane dépt': EXAMPLE_QUERY,
+    'agrégat par dépt': """SELECT DEPARTEMENT, count(*) AS n, sum(FRAIS_REPRESENTATION) / sum(POP_2022) AS eur_hab
+                           FROM communes GROUP BY DEPARTEMENT ORDER BY eur_hab DESC""",
+    'recherche texte': "SELECT * FROM communes WHERE NOM_COMMUNE ILIKE '%saint%'",
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=500000)
+    args = parser.parse_args()
+
+    df = make_synthetic(args.rows)
+    print(f"{args.rows} communes")
+    for label, sql in QUERIES.items():
+        t0 = time.perf_counter()
+        result, truncated, _, _ = run_query(df, sql)
+        cold = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        run_query(df, sql)
+        cached = time.perf_counter() - t0
+        print(f"{label:28s} {len(result):6d} lignes{' (tronqué)' if truncated else '':11s}"
+              f" {cold * 1000:8.0f} ms   cache : {cached * 1000:6.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
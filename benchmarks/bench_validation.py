@@ -0,0 +1,36 @@
+"""
+Durée du contrôle qualité sur des jeux synthétiques
+
+Usage : python -m benchmarks.bench_validation [--sizes 35000 500000] [--repeat 5]
+"""
+
+import argparse
+import time
+
+from synthetic import make_synthetic
+from validation import RULES, validate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[35000, 500000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    for n_rows in args.sizes:
+        df = make_synthetic(n_rows)
+        timings = []
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            report, flagged = validate(df)
+            timings.append(time.perf_counter() - t0)
+        print(f"{n_rows:8d} lignes  {len(RULES)} règles  {min(timings) * 1000:8.1f} ms"
+              f"  {len(flagged):6d} lignes signalées")
+        for rule in RULES:
+            t0 = time.perf_counter()
+            rule.check(df)
+            print(f"    {rule.name:24s} {(time.perf_counter() - t0) * 1000:7.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
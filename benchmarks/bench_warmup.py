@@ -0,0 +1,67 @@
+"""
+Temps de rendu pour le premier visiteur, avec et sans préchauffage
+
+Chaque scénario tourne dans un processus neuf :
+- froid : le premier visiteur arrive dès le démarrage du processus ;
+- chaud : le premier visiteur arrive une fois /ready au vert.
+
+Usage : python -m benchmarks.bench_warmup [--repeat 3]
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+
+def first_visit(mode):
+    from streamlit.testing.v1 import AppTest
+
+    import warmup
+
+    warmup_s = None
+    if mode == 'chaud':
+        t0 = time.perf_counter()
+        warmup.start()
+        warmup.wait()
+        warmup_s = time.perf_counter() - t0
+
+    at = AppTest.from_file('app.py', default_timeout=600)
+    t0 = time.perf_counter()
+    at.run()
+    first_s = time.perf_counter() - t0
+    if at.exception:
+        raise RuntimeError(at.exception)
+    print(json.dumps({'warmup_s': warmup_s, 'first_s': first_s}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--child', choices=['froid', 'chaud'])
+    args = parser.parse_args()
+
+    if args.child:
+        sys.path.insert(0, '.')
+        first_visit(args.child)
+        return
+
+    for mode in ('froid', 'chaud'):
+        runs = []
+        for _ in range(args.repeat):
+            out = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.bench_warmup', '--child', mode],
+                capture_output=True, text=True, check=True
+            ).stdout
+            runs.append(json.loads(out.strip().splitlines()[-1]))
+        first = statistics.median(r['first_s'] for r in runs)
+        line = f"{mode:6s} premier rendu : {first * 1000:8.0f} ms"
+        if mode == 'chaud':
+            line += f"   (préchauffage : {statistics.median(r['warmup_s'] for r in runs) * 1000:.0f} ms)"
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,282 @@
+"""
+Garde-fou de performance : mesures par étape comparées aux baselines du dépôt
+
+Chaque étape (chargement, filtrage, carte, onglets...) est mesurée sur un jeu
+synthétique de taille fixe, caches vidés : médiane et p95 sur `--repeat`
+exécutions, puis pic de mémoire (tracemalloc) sur une exécution séparée.
+Les baselines sont versionnées dans benchmarks/baselines.json.
+
+Une étape régresse si l'écart de médiane dépasse le plus grand de :
+- REL_TOL x médiane de référence ;
+- NOISE_FACTOR x dispersion de la référence (p95 - médiane), plafonnée à
+  REL_TOL x médiane : une mesure courante bruitée n'élargit pas son propre seuil ;
+- ABS_FLOOR_MS (en dessous, l'écart n'est pas significatif).
+Une étape en régression est remesurée (`--confirm` fois) et la meilleure
+médiane est retenue : un processus ralenti par un voisin ne suffit pas à
+faire échouer le contrôle.
+Pour la mémoire : plus de MEM_REL_TOL et de MEM_FLOOR_MB d'augmentation.
+
+Usage :
+    python -m benchmarks.regression                  # mesure + rapport, code 1 si régression
+    python -m benchmarks.regression --update         # réécrit les baselines
+    python -m benchmarks.regression --stages filtre carte --repeat 5
+    python -m benchmarks.regression --save run.json  # conserve la mesure
+    python -m benchmarks.regression --current run.json  # compare une mesure existante
+"""
+
+import os
+
+# Mesures locales au processus : pas de magasin partagé ni de débordement disque
+# (à fixer avant l'import de cache, qui lit ces variables)
+os.environ.pop('ARTIFACT_STORE_DIR', None)
+os.environ.pop('CACHE_SPILL_DIR', None)
+
+import argparse
+import json
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from bootstrap import pairwise_tests, party_intervals
+from cache import cache_manager
+from cube import build_cube
+from data import dataset_facets, default_filters, filter_data, read_dataset
+from export import WRITERS
+from figures import build_budget_figures
+from maps import create_map
+from query import EXAMPLE_QUERY, run_query
+from similarity import SimilarityIndex
+from synthetic import make_synthetic
+from validation import validate
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baselines.json')
+
+REL_TOL = 0.20
+NOISE_FACTOR = 2.0
+ABS_FLOOR_MS = 2.0
+MEM_REL_TOL = 0.10
+MEM_FLOOR_MB = 1.0
+
+
+def _load_setup(df):
+    # CSV brut écrit une fois, relu à chaque mesure
+    path = os.path.join(tempfile.mkdtemp(prefix='bench-'), 'communes.csv')
+    df.to_csv(path, index=False)
+    return lambda: read_dataset(path)
+
+
+def _filter_setup(df):
+    filters = default_filters(dataset_facets(df))
+    return lambda: filter_data(df, **filters)
+
+
+def _search_setup(df):
+    filters = dict(default_filters(dataset_facets(df)), search_commune='saint', selected_depts=['13', '33', '69'])
+    return lambda: filter_data(df, **filters)
+
+
+def _export_setup(fmt):
+    def setup(df):
+        def run():
+            with tempfile.TemporaryFile() as f:
+                WRITERS[fmt](df, f)
+        return run
+    return setup
+
+
+def _similarity_setup(df):
+    # Index construit puis 100 requêtes unitaires
+    positions = df.index[:100].to_numpy()
+
+    def run():
+        index = SimilarityIndex(df)
+        for position in positions:
+            index.neighbors(position, 10)
+    return run
+
+
+def _bootstrap_run(df):
+    party_intervals(df)
+    pairwise_tests(df)
+
+
+# Étape -> (taille du jeu synthétique, préparation renvoyant la fonction mesurée).
+# La carte est mesurée sur un jeu réduit : son coût est linéaire en marqueurs.
+STAGES = {
+    'chargement': (35000, _load_setup),
+    'filtre': (35000, _filter_setup),
+    'filtre recherche': (35000, _search_setup),
+    'qualité': (35000, lambda df: lambda: validate(df)),
+    'carte': (2000, lambda df: lambda: create_map.__wrapped__(df)),
+    'onglet budget': (35000, lambda df: lambda: build_budget_figures.__wrapped__(df)),
+    'cube': (35000, lambda df: lambda: build_cube(df)),
+    'bootstrap': (35000, lambda df: lambda: _bootstrap_run(df)),
+    'sql': (35000, lambda df: lambda: run_query(df, EXAMPLE_QUERY)),
+    'similarité': (35000, _similarity_setup),
+    'export csv': (35000, _export_setup('csv')),
+    'export parquet': (35000, _export_setup('parquet')),
+}
+
+
+def machine():
+    return {
+        'python': platform.python_version(),
+        'système': f"{platform.system()} {platform.machine()}",
+        'cœurs': os.cpu_count(),
+    }
+
+
+def measure(name, repeat):
+    size, setup = STAGES[name]
+    df = make_synthetic(size)
+    func = setup(df)
+
+    samples = []
+    for _ in range(repeat):
+        cache_manager.clear()
+        t0 = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - t0) * 1000)
+
+    cache_manager.clear()
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    samples.sort()
+    return {
+        'lignes': size,
+        'répétitions': repeat,
+        'médiane_ms': round(statistics.median(samples), 3),
+        'p95_ms': round(samples[min(len(samples) - 1, int(round(0.95 * (len(samples) - 1))))], 3),
+        'mémoire_mo': round(peak / 1024 ** 2, 2),
+    }
+
+
+def _log(name, r):
+    print(f"  {name:18s} {r['médiane_ms']:10.1f} ms  p95 {r['p95_ms']:10.1f} ms  {r['mémoire_mo']:8.1f} Mo",
+          file=sys.stderr)
+
+
+def run(stages, repeat):
+    results = {}
+    for name in stages:
+        results[name] = measure(name, repeat)
+        _log(name, results[name])
+    return {'machine': machine(), 'étapes': results}
+
+
+def confirm(baseline, current, repeat, attempts):
+    """Remesure les étapes en régression et garde la meilleure médiane"""
+    for name, cur in current['étapes'].items():
+        base = baseline['étapes'].get(name)
+        for _ in range(attempts):
+            if base is None or verdict(base, cur)[0] != 'RÉGRESSION':
+                break
+            print(f"  {name} : régression apparente, nouvelle mesure", file=sys.stderr)
+            retry = measure(name, repeat)
+            _log(name, retry)
+            if retry['médiane_ms'] < cur['médiane_ms']:
+                cur = current['étapes'][name] = retry
+    return current
+
+
+def verdict(base, current):
+    """Compare une étape à sa référence ; retourne (verdict, seuil en ms)"""
+    noise = min(max(0.0, base['p95_ms'] - base['médiane_ms']), REL_TOL * base['médiane_ms'])
+    threshold = max(REL_TOL * base['médiane_ms'], NOISE_FACTOR * noise, ABS_FLOOR_MS)
+    delta = current['médiane_ms'] - base['médiane_ms']
+    mem_delta = current['mémoire_mo'] - base['mémoire_mo']
+    mem_regressed = mem_delta > max(MEM_REL_TOL * base['mémoire_mo'], MEM_FLOOR_MB)
+    if current['lignes'] != base['lignes']:
+        return 'taille différente', threshold
+    if delta > threshold:
+        return 'RÉGRESSION', threshold
+    if mem_regressed:
+        return 'RÉGRESSION mémoire', threshold
+    if delta < -threshold:
+        return 'amélioration', threshold
+    return 'ok', threshold
+
+
+def report(baseline, current):
+    """Rapport lisible ; retourne (texte, nombre de régressions)"""
+    lines = []
+    if baseline['machine'] != current['machine']:
+        lines.append(f"Attention : machine différente de celle des baselines "
+                     f"({baseline['machine']} vs {current['machine']}).")
+        lines.append("")
+    header = (f"{'Étape':18s} {'Lignes':>7s} {'Réf. (ms)':>10s} {'Mesure (ms)':>11s} {'Écart':>8s}"
+              f" {'Seuil':>8s} {'p95 (ms)':>9s} {'Mém. réf.':>9s} {'Mém.':>7s} {'Δ mém.':>7s}  Verdict")
+    lines += [header, '-' * len(header)]
+    regressions = 0
+    for name, cur in current['étapes'].items():
+        base = baseline['étapes'].get(name)
+        if base is None:
+            lines.append(f"{name:18s} {cur['lignes']:7d} {'-':>10s} {cur['médiane_ms']:11.1f}"
+                         f" {'':>8s} {'':>8s} {cur['p95_ms']:9.1f} {'-':>9s} {cur['mémoire_mo']:7.1f}"
+                         f" {'':>7s}  nouvelle étape")
+            continue
+        status, threshold = verdict(base, cur)
+        regressions += status.startswith('RÉGRESSION')
+        change = (cur['médiane_ms'] / base['médiane_ms'] - 1) * 100 if base['médiane_ms'] else 0.0
+        lines.append(
+            f"{name:18s} {cur['lignes']:7d} {base['médiane_ms']:10.1f} {cur['médiane_ms']:11.1f}"
+            f" {change:+7.1f}% {threshold:7.1f}ms {cur['p95_ms']:9.1f} {base['mémoire_mo']:8.1f}M"
+            f" {cur['mémoire_mo']:6.1f}M {cur['mémoire_mo'] - base['mémoire_mo']:+6.1f}M  {status}"
+        )
+    lines.append("")
+    lines.append(f"{regressions} régression(s) sur {len(current['étapes'])} étape(s).")
+    return '\n'.join(lines), regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--stages', nargs='+', choices=list(STAGES), default=list(STAGES))
+    parser.add_argument('--repeat', type=int, default=7)
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--update', action='store_true', help="réécrit les baselines avec cette mesure")
+    parser.add_argument('--save', help="enregistre la mesure dans ce fichier JSON")
+    parser.add_argument('--current', help="compare une mesure enregistrée au lieu de mesurer")
+    parser.add_argument('--confirm', type=int, default=2, help="nouvelles mesures d'une étape en régression")
+    args = parser.parse_args()
+
+    if args.current:
+        with open(args.current, encoding='utf-8') as f:
+            current = json.load(f)
+    else:
+        current = run(args.stages, args.repeat)
+
+    if args.update:
+        baseline = {'machine': current['machine'], 'étapes': {}}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, encoding='utf-8') as f:
+                baseline['étapes'] = json.load(f)['étapes']
+        baseline['étapes'].update(current['étapes'])
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(baseline, f, ensure_ascii=False, indent=2)
+            f.write('\n')
+        print(f"Baselines mises à jour : {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"Pas de baselines ({args.baseline}) : lancer avec --update.")
+        return 2
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    if not args.current:
+        current = confirm(baseline, current, args.repeat, args.confirm)
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(current, f, ensure_ascii=False, indent=2)
+    text, regressions = report(baseline, current)
+    print(text)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
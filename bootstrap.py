@@ -0,0 +1,148 @@
+"""
+Intervalles de confiance bootstrap et tests de comparaison par couleur politique
+
+- Moyenne : rééchantillonnage par blocs (matrice d'indices int32 par bloc,
+  partagée par toutes les colonnes), blocs répartis sur un pool de threads
+  (take / sum relâchent le GIL).
+- Médiane : tirage exact de la statistique d'ordre du rééchantillon. Si les
+  indices sont tirés uniformément dans les valeurs triées, le k-ième plus
+  petit indice vaut floor(n * U(k)) avec U(k) ~ Beta(k, n - k + 1) : une
+  médiane bootstrap coûte O(1) au lieu d'un rééchantillon complet.
+- Comparaisons deux à deux : distribution bootstrap de l'écart entre groupes
+  (rééchantillons indépendants), p-value bilatérale, correction de Holm.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+
+from cache import cache_manager, frame_key
+
+# Nombre max d'éléments d'une matrice de rééchantillonnage (borne mémoire par bloc)
+BLOCK_ELEMENTS = 2_000_000
+
+STAT_LABELS = {'mean': 'Moyenne', 'median': 'Médiane'}
+
+_pool = ThreadPoolExecutor(max_workers=os.cpu_count() or 2, thread_name_prefix='bootstrap')
+
+
+def _mean_block(columns, size, seed):
+    rng = np.random.default_rng(seed)
+    idx = rng.integers(0, columns.shape[1], size=(size, columns.shape[1]), dtype=np.int32)
+    # Les mêmes communes rééchantillonnées servent pour toutes les colonnes
+    return np.stack([np.take(col, idx).sum(axis=1, dtype=np.float64) / columns.shape[1] for col in columns])
+
+
+def bootstrap_means(values, n_resamples, seed=0):
+    """Distribution bootstrap de la moyenne
+
+    `values` peut être 2D (n lignes x k colonnes) : les k moyennes sont alors
+    calculées sur les mêmes rééchantillons, et le résultat est de forme (k, B).
+    """
+    values = np.asarray(values, dtype=np.float32)
+    columns = np.ascontiguousarray(values.T if values.ndim == 2 else values[np.newaxis])
+    block = max(1, BLOCK_ELEMENTS // columns.shape[1])
+    sizes = [min(block, n_resamples - start) for start in range(0, n_resamples, block)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    futures = [_pool.submit(_mean_block, columns, size, s) for size, s in zip(sizes, seeds)]
+    means = np.concatenate([f.result() for f in futures], axis=1)
+    return means if values.ndim == 2 else means[0]
+
+
+def bootstrap_medians(values, n_resamples, seed=0):
+    """Distribution bootstrap de la médiane (tirage exact des statistiques d'ordre)"""
+    s = np.sort(np.asarray(values, dtype=np.float64))
+    n = len(s)
+    rng = np.random.default_rng(seed)
+    k = (n + 1) // 2
+    u_k = rng.beta(k, n - k + 1, size=n_resamples)
+    low = s[np.minimum((u_k * n).astype(np.int64), n - 1)]
+    if n % 2:
+        return low
+    # n pair : moyenne des statistiques d'ordre k et k+1 ;
+    # U(k+1) = U(k) + (1 - U(k)) * Beta(1, n - k)
+    u_next = u_k + (1 - u_k) * rng.beta(1, n - k, size=n_resamples)
+    high = s[np.minimum((u_next * n).astype(np.int64), n - 1)]
+    return (low + high) / 2
+
+
+def _percentiles(samples, confidence):
+    return np.percentile(samples, [(1 - confidence) / 2 * 100, (1 + confidence) / 2 * 100])
+
+
+def group_distributions(df, columns=('EUR_PAR_HAB', 'RATIO_FRAIS_REP'), n_resamples=2000, seed=0):
+    """Distributions bootstrap {(colonne, stat): {couleur: échantillons}} et effectifs"""
+    def compute():
+        groups = {party: g for party, g in df.groupby('COUL_POL', observed=True) if len(g)}
+        dists = {}
+        for col in columns:
+            for stat in STAT_LABELS:
+                dists[(col, stat)] = {}
+        for i, (party, g) in enumerate(groups.items()):
+            means = bootstrap_means(g[list(columns)].to_numpy(), n_resamples, seed + i)
+            for j, col in enumerate(columns):
+                dists[(col, 'mean')][party] = means[j]
+                dists[(col, 'median')][party] = bootstrap_medians(g[col].to_numpy(), n_resamples, seed + i)
+        sizes = {party: len(g) for party, g in groups.items()}
+        observed = {
+            (col, stat): {party: getattr(np, stat)(g[col].to_numpy(dtype=np.float64))
+                          for party, g in groups.items()}
+            for col in columns for stat in STAT_LABELS
+        }
+        return dists, observed, sizes
+
+    key = ('bootstrap', frame_key(df), tuple(columns), n_resamples, seed)
+    return cache_manager.namespace('aggregates').get_or_compute(key, compute)
+
+
+def party_intervals(df, columns=('EUR_PAR_HAB', 'RATIO_FRAIS_REP'), n_resamples=2000,
+                    confidence=0.95, seed=0):
+    """Estimations et IC bootstrap (percentile) par couleur politique, une ligne par couleur"""
+    dists, observed, sizes = group_distributions(df, columns, n_resamples, seed)
+    rows = []
+    for party, n in sizes.items():
+        row = {'COUL_POL': party, 'n': n}
+        for (col, stat), samples in dists.items():
+            low, high = _percentiles(samples[party], confidence)
+            row[(col, stat)] = observed[(col, stat)][party]
+            row[(col, stat, 'low')] = low
+            row[(col, stat, 'high')] = high
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def holm(p_values):
+    """Correction de Holm-Bonferroni pour comparaisons multiples"""
+    p = np.asarray(p_values, dtype=np.float64)
+    adjusted = np.empty_like(p)
+    running = 0.0
+    for rank, i in enumerate(np.argsort(p)):
+        running = max(running, min(1.0, p[i] * (len(p) - rank)))
+        adjusted[i] = running
+    return adjusted
+
+
+def pairwise_tests(df, column='EUR_PAR_HAB', stat='mean', n_resamples=2000, seed=0):
+    """Comparaisons deux à deux des couleurs politiques sur une statistique
+
+    p-value bilatérale : 2 x la proportion des écarts bootstrap du mauvais
+    côté de zéro, bornée par 1/(B+1).
+    """
+    dists, observed, _ = group_distributions(df, n_resamples=n_resamples, seed=seed)
+    samples = dists[(column, stat)]
+    rows = []
+    for a, b in combinations(samples, 2):
+        diff = samples[a] - samples[b]
+        tail = min(np.count_nonzero(diff <= 0), np.count_nonzero(diff >= 0))
+        rows.append({
+            'Groupe A': a,
+            'Groupe B': b,
+            'Écart': observed[(column, stat)][a] - observed[(column, stat)][b],
+            'p-value': min(1.0, 2 * (tail + 1) / (len(diff) + 1)),
+        })
+    result = pd.DataFrame(rows, columns=['Groupe A', 'Groupe B', 'Écart', 'p-value'])
+    result['p-value (Holm)'] = holm(result['p-value'].to_numpy())
+    return result
@@ -0,0 +1,360 @@
+"""
+Gestionnaire de cache central pour les artefacts dérivés (cartes, agrégats, figures)
+
+Chaque espace de noms a son propre budget en octets, une éviction LRU + TTL
+et, en option, un débordement sur disque des entrées évincées.
+Le gestionnaire est un singleton de processus : il est partagé entre toutes
+les sessions Streamlit d'un même conteneur. Les espaces marqués `shared`
+passent en outre par le magasin d'artefacts commun aux répliques
+(store.py, activé par ARTIFACT_STORE_DIR).
+"""
+
+import hashlib
+import os
+import pickle
+import shutil
+import socket
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from store import build_store, store_version
+
+MB = 1024 * 1024
+
+# Répertoire de débordement d'une autre réplique supprimé après ce délai sans écriture (s)
+SPILL_ORPHAN_S = 86400
+
+# Budgets par défaut (Mo) et durée de vie (s) des espaces de noms connus.
+# Surchargeables via CACHE_BUDGET_MB_<NOM> / CACHE_TTL_<NOM>. Total : 384 Mo,
+# à ajouter à SQL_MEMORY_LIMIT (256 Mo) et au processus lui-même (~300 Mo)
+# pour dimensionner mem_limit.
+# `shared` : artefacts construits une fois pour toutes les répliques, seulement
+# s'ils se relisent bien plus vite qu'ils ne se construisent : les cartes le sont
+# sous forme de HTML rendu (millisecondes contre secondes), pas les figures Plotly
+# (les relire coûte autant que les construire).
+DEFAULT_NAMESPACES = {
+    'dataset': {'max_mb': 128, 'ttl': None, 'spill': False, 'shared': True},
+    'maps': {'max_mb': 64, 'ttl': 3600, 'spill': True, 'shared': True},
+    'selections': {'max_mb': 48, 'ttl': 3600, 'spill': False},
+    'aggregates': {'max_mb': 48, 'ttl': 3600, 'spill': False, 'shared': True},
+    'figures': {'max_mb': 32, 'ttl': 3600, 'spill': False},
+    'sql': {'max_mb': 16, 'ttl': 600, 'spill': False},
+    'exports': {'max_mb': 48, 'ttl': 3600, 'spill': True, 'shared': True},
+}
+
+
+def sizeof(obj, _seen=None):
+    """Estime la taille mémoire d'un objet en octets, sans le sérialiser
+
+    Les figures Plotly sont mesurées sur leurs données, les autres objets
+    parcourus récursivement.
+    """
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        usage = obj.memory_usage(deep=True)
+        return int(usage.sum()) if isinstance(obj, pd.DataFrame) else int(usage)
+    if isinstance(obj, (np.ndarray, pa.Table)):
+        return int(obj.nbytes)
+    if isinstance(obj, (bytes, bytearray, str)):
+        return len(obj)
+
+    # Conteneurs et objets : parcours avec garde contre les cycles (les objets
+    # vus restent référencés : un temporaire libéré libérerait aussi son id)
+    _seen = {} if _seen is None else _seen
+    if id(obj) in _seen:
+        return 0
+    _seen[id(obj)] = obj
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(sizeof(k, _seen) + sizeof(v, _seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(sizeof(item, _seen) for item in obj)
+    elif hasattr(obj, 'to_plotly_json'):
+        size += sizeof(obj.to_plotly_json(), _seen)
+    elif hasattr(obj, '__dict__'):
+        size += sizeof(vars(obj), _seen)
+    return size
+
+
+def content_digest(df):
+    """Empreinte du contenu d'un DataFrame (index compris)"""
+    hashes = pd.util.hash_pandas_object(df, index=True).to_numpy()
+    return hashlib.sha1(hashes.tobytes() + repr(tuple(df.columns)).encode()).hexdigest()
+
+
+def frame_key(df, *extra):
+    """Clé stable d'une sélection : instantané d'origine, lignes retenues + paramètres supplémentaires
+
+    L'instantané est identifié par df.attrs['snapshot'] (empreinte du fichier
+    source, posée au chargement et propagée par pandas aux sélections) ; à
+    défaut, par l'empreinte du contenu.
+    """
+    snapshot = df.attrs.get('snapshot') or content_digest(df)
+    h = hashlib.sha1(np.ascontiguousarray(df.index.values).tobytes())
+    h.update(repr((snapshot, len(df), tuple(df.columns), extra)).encode())
+    return h.hexdigest()
+
+
+class Namespace:
+    """Cache LRU borné en octets, avec TTL et débordement disque optionnel"""
+
+    def __init__(self, name, max_bytes, ttl=None, spill_dir=None, store=None):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.spill_dir = os.path.join(spill_dir, name) if spill_dir else None
+        self.store = store
+        self._entries = OrderedDict()  # key -> (valeur, taille, horodatage)
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self._pending = {}  # key -> Event des calculs en cours
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.disk_hits = 0
+
+    # --- Disque -----------------------------------------------------------
+    def _spill_path(self, key):
+        return os.path.join(self.spill_dir, hashlib.sha1(repr(key).encode()).hexdigest() + '.pkl')
+
+    def _spill(self, key, value):
+        if not self.spill_dir:
+            return
+        try:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            tmp = f"{self._spill_path(key)}.{os.getpid()}.tmp"
+            with open(tmp, 'wb') as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self._spill_path(key))
+        except Exception:
+            pass  # Le débordement est une optimisation, jamais une erreur
+
+    def _unspill(self, key):
+        if not self.spill_dir:
+            return None
+        path = self._spill_path(key)
+        if not os.path.exists(path):
+            return None
+        if self.ttl is not None and time.time() - os.path.getmtime(path) > self.ttl:
+            os.remove(path)
+            return None
+        try:
+            with open(path, 'rb') as f:
+                return pickle.load(f)
+        except Exception:
+            return None
+
+    def disk_bytes(self):
+        if not self.spill_dir or not os.path.isdir(self.spill_dir):
+            return 0
+        return sum(e.stat().st_size for e in os.scandir(self.spill_dir) if e.is_file())
+
+    # --- Mémoire ----------------------------------------------------------
+    def _evict(self, key, spill):
+        value, size, _ = self._entries.pop(key)
+        self._bytes -= size
+        if spill:
+            self._spill(key, value)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if self.ttl is not None and time.time() - entry[2] > self.ttl:
+                    self._evict(key, spill=False)
+                    self.expirations += 1
+                else:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+            value = self._unspill(key)
+            if value is not None:
+                self.disk_hits += 1
+                self.hits += 1
+                self._store(key, value)
+                return value
+            self.misses += 1
+            return default
+
+    def _store(self, key, value):
+        size = sizeof(value)
+        if key in self._entries:
+            self._evict(key, spill=False)
+        if size > self.max_bytes:
+            # Trop gros pour la mémoire : directement sur disque si possible
+            self._spill(key, value)
+            return
+        while self._bytes + size > self.max_bytes and self._entries:
+            oldest = next(iter(self._entries))
+            self._evict(oldest, spill=True)
+            self.evictions += 1
+        self._entries[key] = (value, size, time.time())
+        self._bytes += size
+
+    def set(self, key, value):
+        with self._lock:
+            self._store(key, value)
+
+    def get_or_compute(self, key, compute):
+        """Retourne la valeur en cache ou la calcule
+
+        Si un autre thread calcule déjà la même clé, on attend son résultat
+        plutôt que de refaire le calcul ; avec un magasin partagé, il en va de
+        même entre processus.
+        """
+        missing = object()
+        while True:
+            value = self.get(key, missing)
+            if value is not missing:
+                return value
+            with self._lock:
+                event = self._pending.get(key)
+                if event is None:
+                    event = self._pending[key] = threading.Event()
+                    break
+            event.wait()
+        try:
+            value = self.store.get_or_build(self.name, key, compute) if self.store else compute()
+            self.set(key, value)
+            return value
+        finally:
+            with self._lock:
+                del self._pending[key]
+            event.set()
+
+    def clear(self):
+        """Vide la mémoire et le débordement disque de l'espace"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            if self.spill_dir and os.path.isdir(self.spill_dir):
+                for entry in os.scandir(self.spill_dir):
+                    try:
+                        os.remove(entry.path)
+                    except OSError:
+                        pass
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'Espace': self.name,
+                'Entrées': len(self._entries),
+                'Mémoire (Mo)': round(self._bytes / MB, 2),
+                'Budget (Mo)': round(self.max_bytes / MB, 2),
+                'Disque (Mo)': round(self.disk_bytes() / MB, 2),
+                'Hits': self.hits,
+                'Dont disque': self.disk_hits,
+                'Misses': self.misses,
+                'Évictions': self.evictions,
+                'Expirations': self.expirations,
+                'Taux de hit (%)': round(100 * self.hits / lookups, 1) if lookups else 0.0,
+            }
+
+
+class CacheManager:
+    """Registre des espaces de noms du cache"""
+
+    def __init__(self, spill_dir=None, store=None):
+        self.spill_dir = spill_dir
+        self.store = store
+        self._namespaces = {}
+        self._lock = threading.Lock()
+
+    def namespace(self, name, max_mb=32, ttl=None, spill=False, shared=False):
+        """Retourne (et crée si besoin) un espace de noms"""
+        with self._lock:
+            if name not in self._namespaces:
+                max_mb = float(os.environ.get(f'CACHE_BUDGET_MB_{name.upper()}', max_mb))
+                ttl = os.environ.get(f'CACHE_TTL_{name.upper()}', ttl)
+                self._namespaces[name] = Namespace(
+                    name,
+                    max_bytes=int(max_mb * MB),
+                    ttl=float(ttl) if ttl is not None else None,
+                    spill_dir=self.spill_dir if spill else None,
+                    store=self.store if shared else None,
+                )
+            return self._namespaces[name]
+
+    def cached(self, name):
+        """Décorateur : mémoïse une fonction dans l'espace de noms `name`
+
+        La clé est construite à partir des arguments ; les DataFrames sont
+        identifiés par `frame_key`.
+        """
+        def decorator(func):
+            def wrapper(*args, **kwargs):
+                parts = [frame_key(a) if isinstance(a, pd.DataFrame) else a for a in args]
+                key = (func.__qualname__, tuple(parts), tuple(sorted(kwargs.items())))
+                return self.namespace(name).get_or_compute(key, lambda: func(*args, **kwargs))
+            wrapper.__wrapped__ = func
+            wrapper.__doc__ = func.__doc__
+            return wrapper
+        return decorator
+
+    def stats(self):
+        with self._lock:
+            namespaces = list(self._namespaces.values())
+        return pd.DataFrame([ns.stats() for ns in namespaces])
+
+    def clear(self):
+        """Vide tous les espaces de noms et le magasin partagé"""
+        with self._lock:
+            for ns in self._namespaces.values():
+                ns.clear()
+        if self.store is not None:
+            self.store.clear()
+
+
+def _last_write(path):
+    """Date de la dernière écriture sous `path` (répertoire compris)"""
+    latest = os.path.getmtime(path)
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                latest = max(latest, os.path.getmtime(os.path.join(dirpath, name)))
+            except FileNotFoundError:
+                pass
+    return latest
+
+
+def spill_directory():
+    """Répertoire de débordement de ce processus (None si CACHE_SPILL_DIR est vide)
+
+    Un sous-répertoire par version (comme le magasin partagé) et par hôte :
+    chaque réplique a le sien, même sur un volume commun. Les versions
+    précédentes sont supprimées, ainsi que les répertoires des répliques
+    disparues (rien d'écrit depuis SPILL_ORPHAN_S).
+    """
+    root = os.environ.get('CACHE_SPILL_DIR')
+    if not root:
+        return None
+    version = store_version()
+    host = socket.gethostname()
+    if os.path.isdir(root):
+        for entry in os.scandir(root):
+            if entry.name != version and entry.is_dir(follow_symlinks=False):
+                shutil.rmtree(entry.path, ignore_errors=True)
+    current = os.path.join(root, version)
+    if os.path.isdir(current):
+        for entry in os.scandir(current):
+            if entry.name != host and entry.is_dir(follow_symlinks=False):
+                if time.time() - _last_write(entry.path) > SPILL_ORPHAN_S:
+                    shutil.rmtree(entry.path, ignore_errors=True)
+    return os.path.join(current, host)
+
+
+def _build_manager():
+    manager = CacheManager(spill_dir=spill_directory(), store=build_store())
+    for name, cfg in DEFAULT_NAMESPACES.items():
+        manager.namespace(name, **cfg)
+    return manager
+
+
+cache_manager = _build_manager()
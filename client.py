@@ -0,0 +1,146 @@
+"""
+Mode « filtrage dans le navigateur »
+
+Le jeu de données est envoyé une seule fois au navigateur, sous forme d'un
+binaire colonnaire compressé (gzip) : tableaux typés pour les colonnes
+numériques, codes + dictionnaire pour DEPARTEMENT et COUL_POL, noms
+concaténés. Le composant (client_view.html) applique ensuite localement les
+filtres et met à jour métriques et tableau, sans aller-retour vers Python.
+
+Format après décompression :
+    uint32 LE       longueur L de l'en-tête (4 + L multiple de 8)
+    L octets        en-tête JSON {"n": lignes, "columns": [{name, type, offset, length, dictionary?}]}
+    buffers         un par colonne, alignés sur 8 octets (offset depuis la fin de l'en-tête)
+Types : float64, float32, int32, dict (codes int16, -1 = manquant), text
+(UTF-8, valeurs séparées par « \\n »).
+"""
+
+import base64
+import gzip
+import json
+import os
+import re
+import struct
+
+import numpy as np
+import streamlit.components.v1 as components
+
+from cache import cache_manager, frame_key
+
+TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'client_view.html')
+
+# Emplacements du gabarit remplacés en une seule passe
+TEMPLATE_SLOTS = re.compile(r'__CONFIG__|__PAYLOAD__')
+
+# Caractères échappés dans le JSON inséré dans <script> (la recherche vient de ?q=)
+SCRIPT_ESCAPES = {ord('<'): '\\u003c', ord('>'): '\\u003e', ord('&'): '\\u0026'}
+
+# Colonnes envoyées au navigateur et leur encodage
+CLIENT_COLUMNS = {
+    'NOM_COMMUNE': 'text',
+    'DEPARTEMENT': 'dict',
+    'COUL_POL': 'dict',
+    'POP_2022': 'int32',
+    'FRAIS_REPRESENTATION': 'float64',
+    'EUR_PAR_HAB': 'float32',
+    'RATIO_FRAIS_REP': 'float32',
+}
+
+NUMPY_TYPES = {'float64': '<f8', 'float32': '<f4', 'int32': '<i4'}
+
+# Lignes affichées dans le tableau du composant
+TABLE_ROWS = 500
+
+
+def _column_bytes(series, kind):
+    if kind == 'text':
+        return '\n'.join(series.fillna('').astype(str).tolist()).encode('utf-8'), {}
+    if kind == 'dict':
+        categorical = series.astype('category')
+        codes = categorical.cat.codes.to_numpy().astype('<i2')
+        return codes.tobytes(), {'dictionary': [str(c) for c in categorical.cat.categories]}
+    return series.to_numpy(dtype=NUMPY_TYPES[kind]).tobytes(), {}
+
+
+def encode_columnar(df):
+    """Binaire colonnaire compressé (gzip) du jeu de données, voir le format ci-dessus"""
+    columns, buffers, offset = [], [], 0
+    for name, kind in CLIENT_COLUMNS.items():
+        if name not in df.columns:
+            continue
+        data, extra = _column_bytes(df[name], kind)
+        columns.append({'name': name, 'type': kind, 'offset': offset, 'length': len(data), **extra})
+        buffers.append(data + b'\0' * (-len(data) % 8))
+        offset += len(buffers[-1])
+
+    header = json.dumps({'n': len(df), 'columns': columns}, ensure_ascii=False).encode('utf-8')
+    header += b' ' * (-(4 + len(header)) % 8)
+    return gzip.compress(struct.pack('<I', len(header)) + header + b''.join(buffers), compresslevel=6, mtime=0)
+
+
+def client_payload(df):
+    """Binaire encodé en base64, calculé une fois par instantané"""
+    return cache_manager.namespace('dataset').get_or_compute(
+        ('columnar', frame_key(df)), lambda: base64.b64encode(encode_columnar(df)).decode('ascii')
+    )
+
+
+def client_config(filters, facets):
+    """Bornes, pas et valeurs initiales des contrôles du composant"""
+    return {
+        'filters': {
+            'search': filters['search_commune'],
+            'depts': list(filters['selected_depts']),
+            'pop': list(filters['pop_range']),
+            'eur': list(filters['eur_range']),
+            'frais': list(filters['frais_range']),
+            'ratio': list(filters['ratio_range']),
+            'pol': list(filters['coul_selection']),
+        },
+        'facets': {
+            'depts': facets['depts'],
+            'pol': facets['coul_pol'],
+            'pop': [0, facets['pop_max'], 100],
+            'eur': [0.0, facets['eur_max'], 0.1],
+            'frais': [0.0, facets['frais_max'], 100.0],
+            'ratio': [0.0, facets.get('ratio_max', 100.0), 0.01],
+        },
+        'tableRows': TABLE_ROWS,
+    }
+
+
+def script_json(value):
+    """JSON sûr à l'intérieur d'une balise <script> (pas de </script> ni de <!--)"""
+    return json.dumps(value, ensure_ascii=False).translate(SCRIPT_ESCAPES)
+
+
+def render_client_view(df, filters, facets, height=1150):
+    """Affiche le composant de filtrage local, initialisé avec `filters`"""
+    with open(TEMPLATE_PATH, encoding='utf-8') as f:
+        template = f.read()
+    values = {
+        '__CONFIG__': script_json(client_config(filters, facets)),
+        '__PAYLOAD__': client_payload(df),
+    }
+    html = TEMPLATE_SLOTS.sub(lambda m: values[m.group(0)], template)
+    components.html(html, height=height, scrolling=True)
+
+
+def decode_columnar(blob):
+    """Relit le binaire produit par encode_columnar : {colonne: valeurs} (contrôles, scripts)"""
+    raw = gzip.decompress(blob)
+    (length,) = struct.unpack_from('<I', raw)
+    header = json.loads(raw[4:4 + length])
+    columns = {}
+    for col in header['columns']:
+        start = 4 + length + col['offset']
+        data = raw[start:start + col['length']]
+        if col['type'] == 'text':
+            columns[col['name']] = data.decode('utf-8').split('\n') if header['n'] else []
+        elif col['type'] == 'dict':
+            codes = np.frombuffer(data, dtype='<i2')
+            dictionary = np.array(col['dictionary'] + [None], dtype=object)
+            columns[col['name']] = dictionary[codes]
+        else:
+            columns[col['name']] = np.frombuffer(data, dtype=NUMPY_TYPES[col['type']])
+    return columns
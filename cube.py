@@ -0,0 +1,132 @@
+"""
+Cube d'agrégats département × couleur politique × catégorie de population
+
+Le cube ne contient que des mesures additives (comptes et sommes) : tout
+tableau croisé ou sous-total s'obtient en sommant des cellules, puis les
+mesures dérivées (EUR/hab pondéré, ratio frais / charges...) sont calculées
+à partir de ces sommes.
+"""
+
+import numpy as np
+
+from cache import cache_manager, frame_key
+from data import dataset_facets, default_filters
+
+DIMS = ['DEPARTEMENT', 'COUL_POL', 'CATEGORIE_POP']
+
+DIM_LABELS = {
+    'DEPARTEMENT': 'Département',
+    'COUL_POL': 'Couleur politique',
+    'CATEGORIE_POP': 'Catégorie de population',
+}
+
+# Mesures additives stockées dans chaque cellule du cube
+ADDITIVE = {
+    'NB_COMMUNES': ('POP_2022', 'size'),
+    'NB_SANS_FRAIS': ('SANS_FRAIS', 'sum'),
+    'POPULATION': ('POP_2022', 'sum'),
+    'FRAIS': ('FRAIS_REPRESENTATION', 'sum'),
+    'CHARGES': ('TOTAL_CHARGES', 'sum'),
+    'SOMME_EUR_PAR_HAB': ('EUR_PAR_HAB', 'sum'),
+}
+
+# Mesures affichables : (libellé, fonction des sommes, décimales)
+MEASURES = {
+    'EUR_HAB_PONDERE': ('EUR/hab pondéré (frais / population)',
+                        lambda c: c['FRAIS'] / c['POPULATION'].replace(0, np.nan), 2),
+    'RATIO_CHARGES': ('Ratio frais / charges (%)',
+                      lambda c: c['FRAIS'] / c['CHARGES'].replace(0, np.nan) * 100, 3),
+    'EUR_HAB_MOYEN': ('EUR/hab moyen (non pondéré)',
+                      lambda c: c['SOMME_EUR_PAR_HAB'] / c['NB_COMMUNES'].replace(0, np.nan), 2),
+    'NB_COMMUNES': ('Nombre de communes', lambda c: c['NB_COMMUNES'], 0),
+    'NB_SANS_FRAIS': ('Communes à 0 €', lambda c: c['NB_SANS_FRAIS'], 0),
+    'FRAIS': ('Total frais (€)', lambda c: c['FRAIS'], 0),
+    'POPULATION': ('Population', lambda c: c['POPULATION'], 0),
+    'CHARGES': ('Total charges (€)', lambda c: c['CHARGES'], 0),
+}
+
+
+def build_cube(df):
+    """Agrège les lignes en cellules (une par combinaison observée des dimensions)"""
+    source = df[DIMS].copy()
+    if source['CATEGORIE_POP'].isna().any():
+        source['CATEGORIE_POP'] = source['CATEGORIE_POP'].cat.add_categories('Inconnue').fillna('Inconnue')
+    source['POP_2022'] = df['POP_2022'].astype('int64')
+    source['SANS_FRAIS'] = (df['FRAIS_REPRESENTATION'] == 0).astype('int64')
+    for col in ['FRAIS_REPRESENTATION', 'TOTAL_CHARGES', 'EUR_PAR_HAB']:
+        source[col] = df[col].astype('float64')
+
+    cube = source.groupby(DIMS, observed=True).agg(**ADDITIVE).reset_index()
+    return cube
+
+
+def dataset_cube(df):
+    """Cube du jeu complet, construit une fois par instantané"""
+    return cache_manager.namespace('aggregates').get_or_compute(
+        ('cube', frame_key(df)), lambda: build_cube(df)
+    )
+
+
+def cube_for_selection(df, df_filtered, filters):
+    """Cube correspondant à la sélection courante
+
+    Si seuls les filtres portant sur des dimensions du cube sont actifs
+    (départements, couleurs politiques), on découpe le cube complet sans
+    revenir aux lignes. Sinon (recherche, curseurs), on agrège une fois les
+    lignes filtrées.
+    """
+    defaults = default_filters(dataset_facets(df))
+    dims_only = all(
+        filters.get(name) == defaults[name]
+        for name in ('search_commune', 'pop_range', 'eur_range', 'frais_range', 'ratio_range')
+    )
+    if not dims_only:
+        return cache_manager.namespace('aggregates').get_or_compute(
+            ('cube', frame_key(df_filtered)), lambda: build_cube(df_filtered)
+        )
+
+    cube = dataset_cube(df)
+    mask = np.ones(len(cube), dtype=bool)
+    if filters.get('selected_depts'):
+        mask &= cube['DEPARTEMENT'].isin(filters['selected_depts']).to_numpy()
+    if filters.get('coul_selection') is not None:
+        mask &= cube['COUL_POL'].isin(filters['coul_selection']).to_numpy()
+    return cube[mask]
+
+
+def rollup(cube, dims):
+    """Somme des cellules selon `dims` (liste vide : total général)"""
+    sums = list(ADDITIVE)
+    if not dims:
+        return cube[sums].sum().to_frame().T
+    return cube.groupby(dims, observed=True)[sums].sum()
+
+
+def measure(sums, name):
+    """Calcule une mesure (additive ou dérivée) à partir de sommes"""
+    return MEASURES[name][1](sums)
+
+
+def pivot(cube, rows, cols, name):
+    """Tableau croisé `rows` × `cols` d'une mesure, avec totaux
+
+    `cols` peut valoir None pour une simple ventilation par `rows`.
+    """
+    label = 'Total'
+    if cols is None:
+        table = measure(rollup(cube, [rows]), name).to_frame(MEASURES[name][0])
+        table.index = table.index.astype(str)
+        table.loc[label] = measure(rollup(cube, []), name).iloc[0]
+        return table
+
+    table = measure(rollup(cube, [rows, cols]), name).unstack(cols)
+    table.columns = table.columns.astype(str)
+    table.index = table.index.astype(str)
+    row_totals = measure(rollup(cube, [rows]), name)
+    row_totals.index = row_totals.index.astype(str)
+    table[label] = row_totals
+    col_totals = measure(rollup(cube, [cols]), name)
+    col_totals.index = col_totals.index.astype(str)
+    col_totals[label] = measure(rollup(cube, []), name).iloc[0]
+    table.loc[label] = col_totals
+    return table
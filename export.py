@@ -0,0 +1,147 @@
+"""
+Exports de la sélection filtrée (CSV, Parquet, XLSX, GeoJSON)
+
+Chaque format est écrit par morceaux de CHUNK_ROWS lignes dans un fichier
+temporaire : la mémoire de travail reste bornée quelle que soit la taille
+de la sélection. Les fichiers produits sont mis en cache (espace `exports`)
+par empreinte de la sélection, si bien qu'un second téléchargement de la
+même vue est immédiat.
+"""
+
+import json
+import math
+import tempfile
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import xlsxwriter
+
+from cache import cache_manager
+from data import decimal_float64, widen_float32
+from maps import POPUP_FIELDS, valid_coordinates
+
+CHUNK_ROWS = 10_000
+
+# Limite de lignes d'une feuille Excel (en-tête compris)
+XLSX_MAX_ROWS = 1_048_576
+
+# Format -> (libellé, type MIME, extension)
+FORMATS = {
+    'csv': ('CSV (séparateur ;)', 'text/csv', 'csv'),
+    'parquet': ('Parquet', 'application/vnd.apache.parquet', 'parquet'),
+    'xlsx': ('Excel (XLSX)', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+    'geojson': ('GeoJSON (points)', 'application/geo+json', 'geojson'),
+}
+
+
+def iter_chunks(df, size=CHUNK_ROWS):
+    """Tranches successives de `size` lignes (vues, sans copie)"""
+    for start in range(0, len(df), size):
+        yield df.iloc[start:start + size]
+
+
+def _records(chunk):
+    """Colonnes d'une tranche en listes de valeurs Python (NaN -> None)"""
+    columns = []
+    for col in chunk.columns:
+        series = chunk[col]
+        if series.dtype == np.float32:
+            values = decimal_float64(series.to_numpy()).tolist()
+        else:
+            values = series.tolist()
+        columns.append([None if isinstance(v, float) and math.isnan(v) else v for v in values])
+    return zip(*columns)
+
+
+def write_csv(df, f):
+    """CSV au format français (séparateur ;, virgule décimale), en UTF-8"""
+    for i, chunk in enumerate(iter_chunks(df)):
+        chunk = widen_float32(chunk)
+        f.write(chunk.to_csv(index=False, header=i == 0, sep=';', decimal=',').encode('utf-8'))
+    if df.empty:  # sélection vide : ligne d'en-tête seule
+        f.write(df.to_csv(index=False, sep=';', decimal=',').encode('utf-8'))
+
+
+def write_parquet(df, f):
+    writer = None
+    try:
+        for chunk in iter_chunks(df):
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(f, table.schema, compression='zstd')
+            writer.write_table(table)
+        if writer is None:  # sélection vide : fichier avec le seul schéma
+            pq.write_table(pa.Table.from_pandas(df, preserve_index=False), f)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def write_xlsx(df, f):
+    if len(df) >= XLSX_MAX_ROWS:
+        raise ValueError(f"Sélection trop grande pour une feuille Excel ({len(df)} lignes)")
+
+    # constant_memory : chaque ligne est écrite sur disque dès la suivante commencée
+    workbook = xlsxwriter.Workbook(f, {'constant_memory': True, 'in_memory': False})
+    try:
+        sheet = workbook.add_worksheet('Communes')
+        sheet.write_row(0, 0, [str(c) for c in df.columns], workbook.add_format({'bold': True}))
+        # Méthode d'écriture choisie une fois par colonne (évite la détection de type par cellule)
+        numeric = [df[c].dtype.kind in 'iuf' for c in df.columns]
+        row = 1
+        for chunk in iter_chunks(df):
+            for record in _records(chunk):
+                for col, (is_number, value) in enumerate(zip(numeric, record)):
+                    if value is None:
+                        continue
+                    if is_number:
+                        sheet.write_number(row, col, value)
+                    else:
+                        sheet.write_string(row, col, str(value))
+                row += 1
+    finally:
+        workbook.close()
+
+
+def write_geojson(df, f):
+    """Points (communes aux coordonnées valides) avec les champs des popups de la carte"""
+    fields = [c for c in POPUP_FIELDS if c in df.columns]
+    f.write(b'{"type": "FeatureCollection", "features": [\n')
+    first = True
+    for chunk in iter_chunks(df):
+        points, lats, lons = valid_coordinates(chunk)
+        features = [
+            json.dumps({
+                'type': 'Feature',
+                'geometry': {'type': 'Point', 'coordinates': [round(lon, 6), round(lat, 6)]},
+                'properties': dict(zip(fields, record)),
+            }, ensure_ascii=False)
+            for record, lat, lon in zip(_records(points[fields]), lats.tolist(), lons.tolist())
+        ]
+        if features:
+            f.write((('' if first else ',\n') + ',\n'.join(features)).encode('utf-8'))
+            first = False
+    f.write(b'\n]}\n')
+
+
+def available_formats(df):
+    """Formats proposés pour une sélection"""
+    return [fmt for fmt in FORMATS if fmt != 'xlsx' or len(df) < XLSX_MAX_ROWS]
+
+
+WRITERS = {
+    'csv': write_csv,
+    'parquet': write_parquet,
+    'xlsx': write_xlsx,
+    'geojson': write_geojson,
+}
+
+
+@cache_manager.cached('exports')
+def export_selection(df_filtered, fmt):
+    """Contenu du fichier d'export de la sélection au format `fmt` (octets)"""
+    with tempfile.TemporaryFile() as f:
+        WRITERS[fmt](df_filtered, f)
+        f.seek(0)
+        return f.read()
@@ -0,0 +1,188 @@
+"""
+Figures Plotly de l'onglet Budget
+
+Toutes les pièces de l'onglet (métriques, figures, table des ratios) sont
+calculées à partir d'une même vue étroite de la sélection, en parallèle sur
+un pool de threads, puis mises en cache par état des filtres.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+
+from cache import cache_manager
+from formatting import fmt_fr
+from maps import POL_COLORS
+
+# Postes du graphique empilé : libellé -> colonne
+STACK_COLS = {
+    'Personnel': 'CHARGES_PERSONNEL',
+    'Achats/Services': 'ACHATS_SERVICES',
+    'Autres gestion': 'AUTRES_CHARGES_GESTION',
+    'Financières': 'CHARGES_FINANCIERES',
+    'Exceptionnelles': 'CHARGES_EXCEPT',
+}
+
+# Colonnes utilisées par l'onglet (vue partagée par toutes les pièces)
+BUDGET_COLS = ['NOM_COMMUNE', 'DEPARTEMENT', 'COUL_POL', 'POP_2022', 'FRAIS_REPRESENTATION',
+               'TOTAL_CHARGES', 'RATIO_FRAIS_REP', *STACK_COLS.values()]
+
+# Points du nuage de l'aperçu (rendu progressif) ; au-delà, échantillon
+PREVIEW_POINTS = 2000
+
+_pool = ThreadPoolExecutor(max_workers=min(4, os.cpu_count() or 2), thread_name_prefix='figures')
+
+
+def budget_stack_figure(df_filtered):
+    """Répartition des charges des 10 communes au plus gros budget"""
+    top10_budget = df_filtered.nlargest(10, 'TOTAL_CHARGES')
+
+    # Données du graphique empilé, colonne par colonne
+    df_budget = pd.DataFrame({'Commune': top10_budget['NOM_COMMUNE'].str[:15].to_numpy()})
+    for label, col in STACK_COLS.items():
+        df_budget[label] = top10_budget[col].to_numpy(dtype=np.float64) / 1e6
+    fig_budget = px.bar(
+        df_budget,
+        x='Commune',
+        y=list(STACK_COLS),
+        title="",
+        labels={'value': 'Millions €', 'variable': 'Type de charge'},
+        color_discrete_sequence=['#3498db', '#2ecc71', '#f39c12', '#e74c3c', '#9b59b6']
+    )
+    fig_budget.update_layout(
+        xaxis_title="",
+        yaxis_title="Millions €",
+        legend_title="",
+        barmode='stack',
+        separators=", "
+    )
+    return fig_budget
+
+
+def budget_scatter_figure(df_filtered):
+    """Charges totales vs frais de représentation (échelles log)"""
+    fig_scatter_budget = px.scatter(
+        df_filtered[df_filtered['TOTAL_CHARGES'] > 0],
+        x='TOTAL_CHARGES',
+        y='FRAIS_REPRESENTATION',
+        color='COUL_POL',
+        hover_name='NOM_COMMUNE',
+        hover_data=['POP_2022', 'RATIO_FRAIS_REP'],
+        opacity=0.6,
+        color_discrete_map=POL_COLORS
+    )
+    fig_scatter_budget.update_layout(
+        xaxis_title="Charges totales (€)",
+        yaxis_title="Frais de représentation (€)",
+        xaxis_type="log",
+        yaxis_type="log",
+        separators=", "
+    )
+    return fig_scatter_budget
+
+
+def ratio_histogram_figure(df_filtered):
+    """Distribution du ratio frais de représentation / charges totales"""
+    df_ratio = df_filtered.loc[df_filtered['RATIO_FRAIS_REP'] > 0, ['RATIO_FRAIS_REP', 'COUL_POL']]
+    df_ratio = df_ratio.rename(columns={'RATIO_FRAIS_REP': 'RATIO_PERCENT'})
+
+    fig_ratio = px.histogram(
+        df_ratio,
+        x='RATIO_PERCENT',
+        nbins=50,
+        color='COUL_POL',
+        marginal='box',
+        color_discrete_map=POL_COLORS
+    )
+    fig_ratio.update_layout(
+        xaxis_title="Ratio frais représentation / charges totales (%)",
+        yaxis_title="Nombre de communes",
+        separators=", "
+    )
+    return fig_ratio
+
+
+def budget_metrics(df_filtered):
+    """Métriques de l'onglet Budget"""
+    ratio = df_filtered['RATIO_FRAIS_REP'].to_numpy(dtype=np.float64)
+    positive = ratio[ratio > 0]
+    return {
+        'total_charges': np.nansum(df_filtered['TOTAL_CHARGES'].to_numpy(dtype=np.float64)),
+        'total_personnel': np.nansum(df_filtered['CHARGES_PERSONNEL'].to_numpy(dtype=np.float64)),
+        'ratio_moy': positive.mean() if len(positive) else np.nan,
+        'ratio_max': np.nanmax(ratio) if len(ratio) else np.nan,
+    }
+
+
+def top_ratio_table(df_filtered, n=20):
+    """Table des communes au plus haut ratio, formatée pour l'affichage"""
+    top_ratio = df_filtered[df_filtered['RATIO_FRAIS_REP'] > 0].nlargest(n, 'RATIO_FRAIS_REP')[
+        ['NOM_COMMUNE', 'DEPARTEMENT', 'POP_2022', 'FRAIS_REPRESENTATION',
+         'TOTAL_CHARGES', 'RATIO_FRAIS_REP', 'COUL_POL']
+    ].reset_index(drop=True)
+    top_ratio.columns = ['Commune', 'Dépt', 'Pop.', 'Frais rep. (€)', 'Charges totales (€)', 'Ratio (%)', 'Politique']
+    top_ratio['Pop.'] = top_ratio['Pop.'].apply(lambda x: fmt_fr(x))
+    top_ratio['Frais rep. (€)'] = top_ratio['Frais rep. (€)'].apply(lambda x: fmt_fr(x, 2))
+    top_ratio['Charges totales (€)'] = top_ratio['Charges totales (€)'].apply(lambda x: fmt_fr(x))
+    top_ratio['Ratio (%)'] = top_ratio['Ratio (%)'].apply(lambda x: fmt_fr(x, 3))
+    return top_ratio
+
+
+BUILDERS = {
+    'metrics': budget_metrics,
+    'stack': budget_stack_figure,
+    'scatter': budget_scatter_figure,
+    'ratio': ratio_histogram_figure,
+    'top_ratio': top_ratio_table,
+}
+
+
+def budget_preview(df_filtered):
+    """Aperçu de l'onglet Budget, sans Plotly : données agrégées ou échantillonnées des graphiques
+
+    Retourne les métriques et la table comme build_budget_figures, et pour
+    'stack', 'scatter', 'ratio' des DataFrames pour les graphiques natifs.
+    """
+    budget = df_filtered[[c for c in BUDGET_COLS if c in df_filtered.columns]]
+
+    top10 = budget.nlargest(10, 'TOTAL_CHARGES')
+    stack = pd.DataFrame({'Commune': top10['NOM_COMMUNE'].str[:15].to_numpy()})
+    for label, col in STACK_COLS.items():
+        stack[label] = top10[col].to_numpy(dtype=np.float64) / 1e6
+
+    # Échelles log du nuage complet : log10 des montants strictement positifs
+    positive = budget[(budget['TOTAL_CHARGES'] > 0) & (budget['FRAIS_REPRESENTATION'] > 0)]
+    if len(positive) > PREVIEW_POINTS:
+        positive = positive.sample(PREVIEW_POINTS, random_state=0)
+    scatter = pd.DataFrame({
+        'log10 charges (€)': np.log10(positive['TOTAL_CHARGES'].to_numpy(dtype=np.float64)),
+        'log10 frais (€)': np.log10(positive['FRAIS_REPRESENTATION'].to_numpy(dtype=np.float64)),
+        'Politique': positive['COUL_POL'].astype(str).to_numpy(),
+    })
+
+    ratio = budget['RATIO_FRAIS_REP'].to_numpy(dtype=np.float64)
+    counts, edges = np.histogram(ratio[ratio > 0], bins=50)
+    histogram = pd.DataFrame({'Ratio (%)': np.round(edges[:-1], 4), 'Nombre de communes': counts})
+
+    return {
+        'metrics': budget_metrics(budget),
+        'stack': stack,
+        'scatter': scatter,
+        'ratio': histogram,
+        'top_ratio': top_ratio_table(budget),
+    }
+
+
+@cache_manager.cached('figures')
+def build_budget_figures(df_filtered):
+    """Construit les pièces de l'onglet Budget pour une sélection
+
+    Retourne {'metrics', 'stack', 'scatter', 'ratio', 'top_ratio'} ; les pièces
+    sont indépendantes et construites en parallèle.
+    """
+    budget = df_filtered[[c for c in BUDGET_COLS if c in df_filtered.columns]]
+    futures = {name: _pool.submit(builder, budget) for name, builder in BUILDERS.items()}
+    return {name: future.result() for name, future in futures.items()}
@@ -0,0 +1,12 @@
+"""
+Formatage des nombres à la française
+"""
+
+
+def fmt_fr(num, decimals=0):
+    """Formate un nombre au format français: 1 234 567,89"""
+    if decimals > 0:
+        formatted = f"{num:,.{decimals}f}"
+    else:
+        formatted = f"{num:,.0f}"
+    return formatted.replace(',', ' ').replace('.', ',')
@@ -0,0 +1,154 @@
+"""
+Carte Folium des communes
+"""
+
+import folium
+import numpy as np
+import pandas as pd
+
+from cache import cache_manager
+from formatting import fmt_fr
+
+# Champs affichés dans les popups (repris par l'export GeoJSON)
+POPUP_FIELDS = ['NOM_COMMUNE', 'DEPARTEMENT', 'POP_2022', 'FRAIS_REPRESENTATION',
+                'EUR_PAR_HAB', 'RATIO_FRAIS_REP', 'COUL_POL']
+
+# Couleurs des marqueurs par couleur politique
+POL_COLORS = {
+    'Gauche': '#e74c3c',
+    'Droite': '#3498db',
+    'Centre': '#f39c12',
+    'Extrême droite': '#1a1a2e',
+    'Courants politiques divers': '#9b59b6',
+    'Non classé': '#95a5a6',
+}
+
+# Points de l'aperçu rapide (st.map) ; au-delà, échantillon
+PREVIEW_POINTS = 5000
+
+
+def valid_coordinates(df):
+    """Lignes aux coordonnées exploitables (numériques et dans les bornes), et leurs lat/lon
+
+    Masque vectorisé : les valeurs illisibles (#N/D...) deviennent NaN et sont écartées.
+    """
+    lat = pd.to_numeric(df['LATITUDE'], errors='coerce').to_numpy(dtype=np.float64)
+    lon = pd.to_numeric(df['LONGITUDE'], errors='coerce').to_numpy(dtype=np.float64)
+    mask = (np.abs(lat) <= 90) & (np.abs(lon) <= 180)  # False pour les NaN
+    return df[mask], lat[mask], lon[mask]
+
+
+def map_preview(df_filtered, color_by='EUR_PAR_HAB', max_points=PREVIEW_POINTS):
+    """Points de l'aperçu de la carte : lat, lon et couleur des marqueurs de create_map
+
+    Calcul vectorisé, échantillon reproductible au-delà de `max_points`.
+    """
+    df_map, lats, lons = valid_coordinates(df_filtered)
+    if color_by == 'COUL_POL':
+        colors = df_map['COUL_POL'].astype(object).map(POL_COLORS).fillna('#95a5a6').to_numpy()
+    else:
+        # Mêmes seuils que create_map (95e percentile, ratio sans les 0)
+        values = df_filtered[color_by]
+        max_val = (values[values > 0] if color_by == 'RATIO_FRAIS_REP' else values).quantile(0.95)
+        ratio = np.minimum(df_map[color_by].to_numpy(dtype=np.float64) / max_val, 1) if max_val > 0 else 0
+        colors = np.where(ratio < 0.33, '#2ecc71', np.where(ratio < 0.66, '#f39c12', '#e74c3c'))
+    points = pd.DataFrame({'lat': lats, 'lon': lons, 'color': np.broadcast_to(colors, len(lats))})
+    if len(points) > max_points:
+        points = points.sample(max_points, random_state=0)
+    return points
+
+
+@cache_manager.cached('maps')
+def create_map(df_filtered, color_by='EUR_PAR_HAB'):
+    """Crée la carte Folium interactive et retourne son document HTML complet
+
+    Seul le HTML est mis en cache : l'objet Folium occupe une dizaine de fois
+    plus de mémoire, et le cache mesure une chaîne exactement.
+    """
+
+    # Centre de la France
+    m = folium.Map(
+        location=[46.603354, 1.888334],
+        zoom_start=6,
+        tiles='cartodbpositron'
+    )
+
+    # Taille fixe des marqueurs
+    MARKER_RADIUS = 6
+
+    # Seules les communes aux coordonnées valides sont placées
+    df_map, lats, lons = valid_coordinates(df_filtered)
+
+    # Palette de couleurs selon le critère
+    if color_by in ['EUR_PAR_HAB', 'FRAIS_REPRESENTATION', 'RATIO_FRAIS_REP']:
+        # Échelle de couleurs pour la valeur choisie
+        if color_by == 'RATIO_FRAIS_REP':
+            # Pour le ratio, on exclut les 0 du calcul du percentile
+            max_val = df_filtered[df_filtered[color_by] > 0][color_by].quantile(0.95)
+        else:
+            max_val = df_filtered[color_by].quantile(0.95)  # Cap à 95e percentile
+
+        for (_, row), lat, lon in zip(df_map.iterrows(), lats, lons):
+            # Couleur selon la valeur (vert -> orange -> rouge)
+            ratio = min(row[color_by] / max_val, 1) if max_val > 0 else 0
+            if ratio < 0.33:
+                color = '#2ecc71'  # Vert
+            elif ratio < 0.66:
+                color = '#f39c12'  # Orange
+            else:
+                color = '#e74c3c'  # Rouge
+
+            # Tooltip selon le mode
+            if color_by == 'EUR_PAR_HAB':
+                tooltip_text = f"{row['NOM_COMMUNE']}: {fmt_fr(row['EUR_PAR_HAB'], 2)} €/hab"
+            elif color_by == 'RATIO_FRAIS_REP':
+                tooltip_text = f"{row['NOM_COMMUNE']}: {fmt_fr(row['RATIO_FRAIS_REP'], 2)} %"
+            else:
+                tooltip_text = f"{row['NOM_COMMUNE']}: {fmt_fr(row['FRAIS_REPRESENTATION'])} €"
+
+            popup_html = f"""
+            <b>{row['NOM_COMMUNE']}</b><br>
+            Département: {row['DEPARTEMENT']}<br>
+            Population: {fmt_fr(row['POP_2022'])}<br>
+            Frais: {fmt_fr(row['FRAIS_REPRESENTATION'], 2)} €<br>
+            EUR/hab: {fmt_fr(row['EUR_PAR_HAB'], 2)} €<br>
+            Ratio: {fmt_fr(row.get('RATIO_FRAIS_REP', 0), 2)} %<br>
+            Politique: {row['COUL_POL']}
+            """
+
+            folium.CircleMarker(
+                location=[lat, lon],
+                radius=MARKER_RADIUS,
+                color=color,
+                fill=True,
+                fillColor=color,
+                fillOpacity=0.7,
+                popup=folium.Popup(popup_html, max_width=300),
+                tooltip=tooltip_text
+            ).add_to(m)
+
+    else:  # Couleur politique
+        for (_, row), lat, lon in zip(df_map.iterrows(), lats, lons):
+            color = POL_COLORS.get(row['COUL_POL'], '#95a5a6')
+
+            popup_html = f"""
+            <b>{row['NOM_COMMUNE']}</b><br>
+            Département: {row['DEPARTEMENT']}<br>
+            Population: {fmt_fr(row['POP_2022'])}<br>
+            Frais: {fmt_fr(row['FRAIS_REPRESENTATION'], 2)} €<br>
+            EUR/hab: {fmt_fr(row['EUR_PAR_HAB'], 2)} €<br>
+            <b>Politique: {row['COUL_POL']}</b>
+            """
+
+            folium.CircleMarker(
+                location=[lat, lon],
+                radius=MARKER_RADIUS,
+                color=color,
+                fill=True,
+                fillColor=color,
+                fillOpacity=0.7,
+                popup=folium.Popup(popup_html, max_width=300),
+                tooltip=f"{row['NOM_COMMUNE']}: {row['COUL_POL']}"
+            ).add_to(m)
+
+    return m.get_root().render()
@@ -0,0 +1,116 @@
+"""
+Rendu progressif des vues lourdes
+
+Les artefacts coûteux (carte, figures Budget) sont construits sur un pool
+de threads. S'ils sont prêts avant la fin du budget de latence, ils sont
+affichés directement ; sinon un aperçu (échantillonné ou agrégé) prend leur
+place, et le résultat complet le remplace en fin d'exécution du script.
+Un indicateur sous les chiffres clés liste ce qui est encore en cours.
+
+Budget configurable par RENDER_BUDGET_MS (200 ms par défaut) ; 0 désactive
+les aperçus (rendu complet, comme sans ce module).
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+import streamlit as st
+
+RENDER_BUDGET_MS = float(os.environ.get('RENDER_BUDGET_MS', 200))
+
+# Attente minimale d'un artefact, même budget épuisé : un résultat déjà en
+# cache est affiché directement plutôt que précédé d'un aperçu
+MIN_WAIT_S = 0.02
+
+# Lignes de l'aperçu des grands tableaux
+PREVIEW_ROWS = 1000
+
+# Les constructions continuent si la session relance le script : le résultat
+# arrive dans le cache et sert à l'exécution suivante
+_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='refine')
+
+
+class ProgressiveRenderer:
+    """Aperçus dans le budget de latence, puis rendu complet en fin d'exécution"""
+
+    def __init__(self, budget_ms=RENDER_BUDGET_MS):
+        self.budget_s = budget_ms / 1000
+        self.started = time.perf_counter()
+        self._indicator = None
+        self._pending = []  # (libellé, emplacement, future ou None, rendu complet)
+
+    @property
+    def enabled(self):
+        return self.budget_s > 0
+
+    def remaining(self):
+        """Temps restant dans le budget (secondes, 0 si dépassé)"""
+        return max(0.0, self.budget_s - (time.perf_counter() - self.started))
+
+    def place_indicator(self):
+        """Emplacement de l'indicateur de chargement (position courante de la page)"""
+        self._indicator = st.empty()
+        self._update_indicator()
+
+    def _update_indicator(self):
+        if self._indicator is None:
+            return
+        if not self._pending:
+            self._indicator.empty()
+            return
+        labels = ', '.join(label for label, *_ in self._pending)
+        self._indicator.caption(
+            f'<i class="iconoir-refresh-double"></i> Chargement en cours : {labels} — aperçu affiché en attendant',
+            unsafe_allow_html=True,
+        )
+
+    def view(self, label, build, render, preview):
+        """Affiche render(build()) si prêt dans le budget, sinon preview() en attendant
+
+        `build` tourne sur le pool (pas d'appel Streamlit) ; `render` et
+        `preview` écrivent dans l'emplacement réservé à la vue.
+        """
+        placeholder = st.empty()
+        if not self.enabled:
+            with placeholder.container():
+                render(build())
+            return
+        future = _pool.submit(build)
+        try:
+            result = future.result(timeout=max(self.remaining(), MIN_WAIT_S))
+        except TimeoutError:
+            with placeholder.container():
+                preview()
+            self._pending.append((label, placeholder, future, render))
+            self._update_indicator()
+        else:
+            with placeholder.container():
+                render(result)
+
+    def deferred(self, label, render, preview):
+        """Rendu coûteux pour le script lui-même (ex. gros tableau) : aperçu, puis complet à la fin"""
+        placeholder = st.empty()
+        with placeholder.container():
+            if not self.enabled:
+                render()
+                return
+            preview()
+        self._pending.append((label, placeholder, None, render))
+        self._update_indicator()
+
+    def finish(self):
+        """Remplace les aperçus par les résultats complets, dans l'ordre d'arrivée"""
+        while self._pending:
+            ready = next((p for p in self._pending if p[2] is None or p[2].done()), self._pending[0])
+            label, placeholder, future, render = ready
+            result = future.result() if future is not None else None
+            # Vidé d'abord : un nouveau conteneur reprendrait sinon les éléments de l'aperçu
+            placeholder.empty()
+            with placeholder.container():
+                if future is None:
+                    render()
+                else:
+                    render(result)
+            self._pending.remove(ready)
+            self._update_indicator()
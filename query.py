@@ -0,0 +1,147 @@
+"""
+Moteur SQL embarqué (DuckDB) sur l'instantané du jeu de données
+
+La table `communes` est l'instantané en mémoire exposé sous forme de table
+Arrow (sans copie des colonnes). Les requêtes sont en lecture seule (une
+seule instruction SELECT, aucun accès fichier/réseau), limitées en lignes
+et en durée, et mises en cache par texte normalisé.
+"""
+
+import os
+import re
+import threading
+import time
+
+import duckdb
+import pyarrow as pa
+
+from cache import cache_manager, frame_key
+from data import widen_float32
+
+TABLE_NAME = 'communes'
+MAX_ROWS = 10_000
+TIMEOUT_S = 10.0
+
+# Bornes du moteur, bien en deçà du mem_limit du conteneur (1 Go) qu'il partage
+# avec l'instantané et les caches
+MEMORY_LIMIT = os.environ.get('SQL_MEMORY_LIMIT', '256MB')
+THREADS = int(os.environ.get('SQL_THREADS', 1))
+
+EXAMPLE_QUERY = """-- Communes dont le ratio dépasse 3 fois la médiane de leur département
+SELECT NOM_COMMUNE, DEPARTEMENT, POP_2022, RATIO_FRAIS_REP,
+       round(median_dept, 4) AS MEDIANE_DEPT
+FROM (
+    SELECT *, median(RATIO_FRAIS_REP) OVER (PARTITION BY DEPARTEMENT) AS median_dept
+    FROM communes
+)
+WHERE RATIO_FRAIS_REP > 3 * median_dept
+ORDER BY RATIO_FRAIS_REP DESC"""
+
+
+class QueryError(Exception):
+    """Requête refusée ou en échec (message affichable tel quel)"""
+
+
+_database = duckdb.connect(':memory:')
+# Mémoire et threads bornés, lecture seule vis-à-vis de l'extérieur, configuration verrouillée
+_database.execute("SET memory_limit = ?", [MEMORY_LIMIT])
+_database.execute("SET threads = ?", [THREADS])
+_database.execute("SET enable_external_access = false")
+_database.execute("SET lock_configuration = true")
+
+_TOKEN = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|--[^\n]*|/\*.*?\*/|\s+|[^'\"\s/-]+|.", re.S)
+
+
+def normalize(sql):
+    """Texte canonique d'une requête : commentaires retirés, espaces réduits
+
+    Les littéraux (chaînes, identifiants entre guillemets) sont conservés tels quels.
+    """
+    parts = []
+    for token in _TOKEN.findall(sql):
+        if token.startswith('--') or token.startswith('/*'):
+            token = ' '
+        if token.isspace():
+            if parts and parts[-1] != ' ':
+                parts.append(' ')
+            continue
+        parts.append(token)
+    return ''.join(parts).strip().rstrip(';').strip()
+
+
+def arrow_snapshot(df):
+    """Vue Arrow de l'instantané (colonnes numériques et chaînes Arrow partagées, sans copie)
+
+    Seuls les ratios float32 sont copiés, en float64 par leur écriture décimale :
+    les résultats affichent 0.17 et non 0.17000000178813934.
+    """
+    return cache_manager.namespace('dataset').get_or_compute(
+        ('arrow', frame_key(df)), lambda: pa.Table.from_pandas(widen_float32(df), preserve_index=False)
+    )
+
+
+def _validate(sql):
+    try:
+        statements = duckdb.extract_statements(sql)
+    except duckdb.Error as exc:
+        raise QueryError(f"Requête invalide : {exc}") from None
+    if len(statements) != 1:
+        raise QueryError("Une seule instruction est autorisée.")
+    if statements[0].type != duckdb.StatementType.SELECT:
+        raise QueryError("Seules les requêtes SELECT sont autorisées.")
+
+
+def _execute(table, sql, max_rows, timeout):
+    cursor = _database.cursor()
+    try:
+        cursor.register(TABLE_NAME, table)
+        result = {}
+
+        def run():
+            try:
+                result['df'] = cursor.execute(
+                    f"SELECT * FROM ({sql}) AS q LIMIT {max_rows + 1}"
+                ).fetch_df()
+            except Exception as exc:  # Remonté dans le thread appelant
+                result['error'] = exc
+
+        worker = threading.Thread(target=run, name='sql-query', daemon=True)
+        worker.start()
+        worker.join(timeout)
+        if worker.is_alive():
+            cursor.interrupt()
+            worker.join()
+            raise QueryError(f"Requête interrompue après {timeout:g} s.")
+        if 'error' in result:
+            raise QueryError(str(result['error']))
+        return result['df']
+    finally:
+        cursor.close()
+
+
+def run_query(df, sql, max_rows=MAX_ROWS, timeout=TIMEOUT_S):
+    """Exécute une requête SELECT sur la table `communes`
+
+    Retourne (DataFrame, tronqué, durée en secondes, depuis le cache).
+    Lève QueryError si la requête est refusée, invalide ou trop longue.
+    """
+    text = normalize(sql)
+    if not text:
+        raise QueryError("Requête vide.")
+    _validate(text)
+
+    namespace = cache_manager.namespace('sql')
+    key = (frame_key(df), text, max_rows)
+    cached = namespace.get(key)
+    if cached is not None:
+        result, truncated, duration = cached
+        return result, truncated, duration, True
+
+    t0 = time.perf_counter()
+    result = _execute(arrow_snapshot(df), text, max_rows, timeout)
+    duration = time.perf_counter() - t0
+    truncated = len(result) > max_rows
+    if truncated:
+        result = result.iloc[:max_rows]
+    namespace.set(key, (result, truncated, duration))
+    return result, truncated, duration, False
@@ -0,0 +1,20 @@
+"""
+Lanceur de l'application : préchauffage + endpoint /ready, puis Streamlit
+
+Usage : python serve.py [options de `streamlit run`...]
+Le préchauffage tourne dans le même processus que le serveur Streamlit :
+les sessions retrouvent donc les artefacts dans le cache partagé.
+"""
+
+import os
+import sys
+
+from streamlit.web import cli as stcli
+
+import warmup
+
+if __name__ == '__main__':
+    warmup.start()
+    warmup.serve_health(int(os.environ.get('READY_PORT', 8502)))
+    sys.argv = ['streamlit', 'run', 'app.py', *sys.argv[1:]]
+    sys.exit(stcli.main())
@@ -0,0 +1,223 @@
+"""
+Recherche de communes similaires (population et structure des charges)
+
+Chaque commune est décrite par un vecteur : log10 de la population et part
+de chaque poste (personnel, achats, financières, exceptionnelles, autres
+charges de gestion) dans TOTAL_CHARGES. Les colonnes sont standardisées puis
+pondérées, et la matrice float32 est calculée une fois par instantané.
+
+Recherche exacte des k plus proches voisins (distance euclidienne) :
+||q - x||² = ||q||² + ||x||² - 2 q·x, le produit q·x étant un produit
+matriciel par blocs de requêtes (borne mémoire BLOCK_ELEMENTS), puis
+présélection par argpartition et reclassement des candidats sur la distance
+directe. Une requête sur 35 000 communes prend moins d'une milliseconde ; le
+voisinage de toutes les communes quelques secondes.
+
+Usage en script :
+    python similarity.py Lyon Marseille --k 10
+    python similarity.py --all --k 20 --output voisins.csv
+"""
+
+import argparse
+import sys
+
+import numpy as np
+import pandas as pd
+
+from cache import cache_manager, frame_key
+
+# Postes de charges : colonne -> libellé (part dans TOTAL_CHARGES)
+SHARE_COLS = {
+    'CHARGES_PERSONNEL': 'Personnel',
+    'ACHATS_SERVICES': 'Achats/Services',
+    'CHARGES_FINANCIERES': 'Financières',
+    'CHARGES_EXCEPT': 'Exceptionnelles',
+    'AUTRES_CHARGES_GESTION': 'Autres gestion',
+}
+
+# La population pèse autant que l'ensemble des parts de charges
+POPULATION_WEIGHT = np.sqrt(len(SHARE_COLS))
+
+# Nombre max d'éléments d'un bloc de distances (requêtes x communes)
+BLOCK_ELEMENTS = 2_000_000
+
+# Candidats supplémentaires reclassés en distance exacte
+RERANK_MARGIN = 16
+
+
+def feature_matrix(df):
+    """Vecteurs bruts (log10 population, parts des postes) et masque des lignes utilisables
+
+    Une commune sans charges totales positives n'a pas de structure de charges :
+    elle est écartée de l'index.
+    """
+    total = df['TOTAL_CHARGES'].to_numpy(dtype=np.float64)
+    valid = np.isfinite(total) & (total > 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        columns = [np.log10(np.maximum(df['POP_2022'].to_numpy(dtype=np.float64), 1))]
+        columns += [np.nan_to_num(df[col].to_numpy(dtype=np.float64) / total) for col in SHARE_COLS]
+    return np.column_stack(columns), valid
+
+
+class SimilarityIndex:
+    """Index exact des plus proches voisins sur les vecteurs normalisés d'un jeu de données"""
+
+    def __init__(self, df):
+        raw, valid = feature_matrix(df)
+        self.positions = np.flatnonzero(valid)  # position dans df de chaque ligne de l'index
+        raw = raw[valid]
+        self.mean = raw.mean(axis=0)
+        std = raw.std(axis=0)
+        self.scale = np.where(std > 0, std, 1.0)
+        self.weights = np.array([POPULATION_WEIGHT] + [1.0] * len(SHARE_COLS))
+        self.matrix = self._normalize(raw)
+        self.sq_norms = np.einsum('ij,ij->i', self.matrix, self.matrix)
+        # Ligne de l'index de chaque position du jeu de données (-1 : hors index)
+        self.row_of = np.full(len(df), -1, dtype=np.int64)
+        self.row_of[self.positions] = np.arange(len(self.positions))
+
+    def _normalize(self, raw):
+        return ((raw - self.mean) / self.scale * self.weights).astype(np.float32)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def search(self, vectors, k=10, exclude=None):
+        """k plus proches voisins de vecteurs déjà normalisés
+
+        `exclude` : ligne de l'index à écarter pour chaque requête (la commune
+        elle-même), ou None. Retourne (positions dans le jeu de données,
+        distances), triées par distance croissante, de forme (requêtes, k).
+        """
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        k = min(k, len(self) - (exclude is not None))
+        candidates = min(k + RERANK_MARGIN, len(self))
+        block = max(1, BLOCK_ELEMENTS // max(len(self), 1))
+        indices = np.empty((len(vectors), k), dtype=np.int64)
+        distances = np.empty((len(vectors), k), dtype=np.float32)
+
+        for start in range(0, len(vectors), block):
+            q = vectors[start:start + block]
+            d2 = self.sq_norms[None, :] - 2 * (q @ self.matrix.T)
+            d2 += np.einsum('ij,ij->i', q, q)[:, None]
+            if exclude is not None:
+                d2[np.arange(len(q)), exclude[start:start + block]] = np.inf
+            top = np.argpartition(d2, candidates - 1, axis=1)[:, :candidates]
+            # Le développement perd en précision pour les vecteurs presque identiques :
+            # les candidats sont reclassés sur la distance calculée directement
+            exact = np.linalg.norm(self.matrix[top] - q[:, None, :], axis=2)
+            if exclude is not None:
+                exact[top == exclude[start:start + block, None]] = np.inf
+            order = np.argsort(exact, axis=1, kind='stable')[:, :k]
+            indices[start:start + len(q)] = np.take_along_axis(top, order, axis=1)
+            distances[start:start + len(q)] = np.take_along_axis(exact, order, axis=1)
+
+        return self.positions[indices], distances
+
+    def neighbors(self, positions, k=10):
+        """k communes les plus proches de chaque commune (positions dans le jeu de données), elle exclue
+
+        Les communes hors index (sans charges totales) n'ont pas de voisins :
+        ValueError.
+        """
+        rows = self.row_of[np.atleast_1d(positions)]
+        if (rows < 0).any():
+            raise ValueError("Commune sans structure de charges (charges totales nulles ou manquantes)")
+        return self.search(self.matrix[rows], k, exclude=rows)
+
+
+def similarity_index(df):
+    """Index du jeu de données, construit une fois par instantané"""
+    return cache_manager.namespace('aggregates').get_or_compute(
+        ('similarity', frame_key(df)), lambda: SimilarityIndex(df)
+    )
+
+
+def similar_communes(df, position, k=10, include_reference=False):
+    """Les k communes les plus proches de la commune à la position `position`
+
+    Retourne leurs lignes du jeu de données avec les parts de charges
+    (colonnes PART_<poste>, en %) et la distance, triées par distance ; avec
+    `include_reference`, la commune elle-même en première ligne (distance 0).
+    """
+    positions, distances = similarity_index(df).neighbors(position, k)
+    positions, distances = positions[0], distances[0]
+    if include_reference:
+        positions = np.concatenate([[position], positions])
+        distances = np.concatenate([[0.0], distances])
+    result = df.iloc[positions].copy()
+    total = result['TOTAL_CHARGES'].to_numpy(dtype=np.float64)
+    for col in SHARE_COLS:
+        result[f'PART_{col}'] = result[col].to_numpy(dtype=np.float64) / total * 100
+    result['DISTANCE'] = distances.astype(np.float32)
+    return result
+
+
+def all_neighbors(df, k=10):
+    """Voisinage de toutes les communes de l'index : une ligne par (commune, voisin)"""
+    index = similarity_index(df)
+    positions, distances = index.neighbors(index.positions, k)
+    codes = df['CODE_COMMUNE'].to_numpy(dtype=object)
+    names = df['NOM_COMMUNE'].to_numpy(dtype=object)
+    frais = df['FRAIS_REPRESENTATION'].to_numpy(dtype=np.float64)
+    source = np.repeat(index.positions, positions.shape[1])
+    return pd.DataFrame({
+        'CODE_COMMUNE': codes[source],
+        'NOM_COMMUNE': names[source],
+        'RANG': np.tile(np.arange(1, positions.shape[1] + 1), len(index)),
+        'CODE_VOISIN': codes[positions.ravel()],
+        'NOM_VOISIN': names[positions.ravel()],
+        'DISTANCE': distances.ravel(),
+        'FRAIS_REPRESENTATION': frais[source],
+        'FRAIS_VOISIN': frais[positions.ravel()],
+    })
+
+
+def find_commune(df, text):
+    """Position d'une commune par code INSEE ou par nom (exact, sinon premier nom contenant `text`)"""
+    codes = df['CODE_COMMUNE'].astype(str)
+    names = df['NOM_COMMUNE'].astype(str)
+    for mask in (codes == text, names.str.casefold() == text.casefold(),
+                 names.str.contains(text, case=False, regex=False)):
+        matches = np.flatnonzero(mask.to_numpy())
+        if len(matches):
+            return int(matches[0])
+    raise KeyError(f"Commune introuvable : {text}")
+
+
+def main():
+    from data import load_dataset
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('communes', nargs='*', help="codes INSEE ou noms de communes")
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--all', action='store_true', help="voisins de toutes les communes")
+    parser.add_argument('--output', help="fichier CSV de sortie (sinon sortie standard)")
+    args = parser.parse_args()
+    if not args.communes and not args.all:
+        parser.error("indiquer des communes ou --all")
+
+    df = load_dataset()
+    if args.all:
+        result = all_neighbors(df, args.k)
+    else:
+        frames = []
+        for text in args.communes:
+            try:
+                position = find_commune(df, text)
+            except KeyError as exc:
+                parser.error(exc.args[0])
+            neighbors = similar_communes(df, position, args.k)
+            neighbors.insert(0, 'REFERENCE', df['NOM_COMMUNE'].iloc[position])
+            frames.append(neighbors[['REFERENCE', 'CODE_COMMUNE', 'NOM_COMMUNE', 'DEPARTEMENT', 'POP_2022',
+                                     'FRAIS_REPRESENTATION', 'EUR_PAR_HAB', 'DISTANCE']])
+        result = pd.concat(frames, ignore_index=True)
+
+    if args.output:
+        result.to_csv(args.output, index=False)
+    else:
+        result.to_csv(sys.stdout, index=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,286 @@
+"""
+Magasin d'artefacts partagé entre processus (répliques)
+
+Un répertoire local, monté dans toutes les répliques, où chaque artefact
+n'est construit qu'une fois : le premier processus qui en a besoin prend
+un verrou de fichier (flock), construit l'artefact et l'écrit de façon
+atomique ; les autres attendent le verrou puis lisent le résultat.
+
+Les DataFrames et tables Arrow sont écrits au format Arrow IPC et relus par
+memory-map : les pages sont partagées par toutes les répliques via le cache
+du système, au lieu d'une copie privée par processus. Les chaînes (HTML
+des cartes) sont écrites telles quelles en UTF-8, les autres objets
+(agrégats, exports) sont picklés. Seuls les artefacts plus rapides à relire
+qu'à reconstruire ont leur place ici : une carte Folium picklée se relisait
+à peine plus vite qu'elle ne se construisait, son HTML se relit en
+quelques millisecondes.
+
+Le volume survit aux redémarrages et aux redéploiements : les artefacts sont
+rangés sous un répertoire de version (STORE_VERSION et versions des
+bibliothèques qui les produisent), les versions périmées sont supprimées à
+l'élagage, et ARTIFACT_STORE_TTL borne l'âge des artefacts.
+"""
+
+import fcntl
+import hashlib
+import os
+import pickle
+import shutil
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from importlib.metadata import PackageNotFoundError, version
+
+import pandas as pd
+import pyarrow as pa
+
+MB = 1024 ** 2
+
+# Extension -> nature de l'artefact
+FRAME_EXT = '.frame.arrow'
+TABLE_EXT = '.table.arrow'
+PICKLE_EXT = '.pkl'
+TEXT_EXT = '.txt'
+LOCK_EXT = '.lock'
+
+# À incrémenter quand le format ou le contenu d'un artefact change
+STORE_VERSION = 3
+
+# Bibliothèques dont la version entre dans celle du magasin (pickles, Arrow, cartes, figures)
+VERSIONED_PACKAGES = ('pandas', 'pyarrow', 'numpy', 'folium', 'plotly')
+
+_MISSING = object()
+
+
+def store_version():
+    """Nom du répertoire de version des artefacts"""
+    versions = [sys.version.split()[0]]
+    for package in VERSIONED_PACKAGES:
+        try:
+            versions.append(f'{package}={version(package)}')
+        except PackageNotFoundError:
+            versions.append(f'{package}=?')
+    digest = hashlib.sha1(repr(versions).encode()).hexdigest()[:12]
+    return f'v{STORE_VERSION}-{digest}'
+
+
+def _types_mapper(arrow_type):
+    # Chaînes relues en string[pyarrow] : les buffers restent ceux du fichier mappé
+    if arrow_type in (pa.string(), pa.large_string()):
+        return pd.StringDtype('pyarrow')
+    return None
+
+
+def _write_arrow(path, table):
+    with pa.OSFile(path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+
+class ArtifactStore:
+    """Artefacts sur disque partagés, construits sous verrou par un seul processus"""
+
+    def __init__(self, root, max_bytes=None, ttl=None):
+        self.root = root
+        self.version = store_version()
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.builds = 0
+        self.reads = 0
+
+    @property
+    def directory(self):
+        """Répertoire des artefacts de la version courante"""
+        return os.path.join(self.root, self.version)
+
+    def _base(self, namespace, key):
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()
+        return os.path.join(self.directory, namespace, digest)
+
+    @contextmanager
+    def _locked(self, base):
+        os.makedirs(os.path.dirname(base), exist_ok=True)
+        with open(base + LOCK_EXT, 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    # --- Lecture / écriture -------------------------------------------------
+    def _expired(self, path):
+        return self.ttl is not None and time.time() - os.path.getmtime(path) > self.ttl
+
+    def _read(self, base):
+        try:
+            if any(os.path.exists(base + ext) and self._expired(base + ext)
+                   for ext in (FRAME_EXT, TABLE_EXT, PICKLE_EXT, TEXT_EXT)):
+                return _MISSING  # Trop ancien : reconstruit (et réécrit)
+            if os.path.exists(base + FRAME_EXT):
+                table = pa.ipc.open_file(pa.memory_map(base + FRAME_EXT)).read_all()
+                value = table.to_pandas(split_blocks=True, types_mapper=_types_mapper)
+            elif os.path.exists(base + TABLE_EXT):
+                value = pa.ipc.open_file(pa.memory_map(base + TABLE_EXT)).read_all()
+            elif os.path.exists(base + PICKLE_EXT):
+                with open(base + PICKLE_EXT, 'rb') as f:
+                    value = pickle.load(f)
+            elif os.path.exists(base + TEXT_EXT):
+                with open(base + TEXT_EXT, encoding='utf-8') as f:
+                    value = f.read()
+            else:
+                return _MISSING
+        except Exception:
+            return _MISSING  # Fichier illisible : reconstruit
+        with self._lock:
+            self.reads += 1
+        return value
+
+    def _write(self, base, value):
+        if isinstance(value, pd.DataFrame):
+            ext, write = FRAME_EXT, lambda p: _write_arrow(p, pa.Table.from_pandas(value))
+        elif isinstance(value, pa.Table):
+            ext, write = TABLE_EXT, lambda p: _write_arrow(p, value)
+        elif isinstance(value, str):
+            def write(p):
+                with open(p, 'w', encoding='utf-8') as f:
+                    f.write(value)
+            ext = TEXT_EXT
+        else:
+            def write(p):
+                with open(p, 'wb') as f:
+                    pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            ext = PICKLE_EXT
+        tmp = f"{base}{ext}.{os.getpid()}.tmp"
+        try:
+            write(tmp)
+            os.replace(tmp, base + ext)
+        except Exception:
+            # Non sérialisable ou disque plein : l'artefact reste privé au processus
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return False
+        return True
+
+    def get_or_build(self, namespace, key, build):
+        """Artefact partagé `key` ; construit par `build()` s'il n'existe pas encore
+
+        Un seul processus construit : les autres attendent le verrou puis
+        relisent l'artefact écrit.
+        """
+        base = self._base(namespace, key)
+        value = self._read(base)
+        if value is not _MISSING:
+            return value
+        with self._locked(base):
+            value = self._read(base)
+            if value is not _MISSING:
+                return value
+            value = build()
+            with self._lock:
+                self.builds += 1
+            if self._write(base, value):
+                self.prune()
+                if isinstance(value, (pd.DataFrame, pa.Table)):
+                    # Version mappée : mémoire partagée plutôt que copie privée
+                    shared = self._read(base)
+                    if shared is not _MISSING:
+                        value = shared
+            return value
+
+    # --- Entretien ----------------------------------------------------------
+    def _files(self):
+        """Artefacts de la version courante : (chemin, taille, date de modification)"""
+        for dirpath, _, filenames in os.walk(self.directory):
+            for name in filenames:
+                if not name.endswith((LOCK_EXT, '.tmp')):
+                    path = os.path.join(dirpath, name)
+                    try:
+                        st = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    yield path, st.st_size, st.st_mtime
+
+    def disk_bytes(self):
+        return sum(size for _, size, _ in self._files())
+
+    @staticmethod
+    def _remove(path):
+        """Supprime un artefact et son verrou"""
+        base = path
+        for ext in (FRAME_EXT, TABLE_EXT, PICKLE_EXT, TEXT_EXT):
+            if path.endswith(ext):
+                base = path[:-len(ext)]
+        for p in (path, base + LOCK_EXT):
+            try:
+                os.remove(p)
+            except FileNotFoundError:
+                pass
+
+    def _remove_old_versions(self):
+        try:
+            entries = list(os.scandir(self.root))
+        except FileNotFoundError:
+            return
+        for entry in entries:
+            if entry.name != self.version:
+                if entry.is_dir(follow_symlinks=False):
+                    shutil.rmtree(entry.path, ignore_errors=True)
+                else:
+                    self._remove(entry.path)
+
+    def prune(self):
+        """Supprime les versions périmées, les artefacts expirés puis les plus anciens au-delà du budget disque
+
+        Les fichiers encore mappés par une réplique restent lisibles pour elle.
+        """
+        self._remove_old_versions()
+        files = sorted(self._files(), key=lambda f: f[2])
+        if self.ttl is not None:
+            expired = [f for f in files if time.time() - f[2] > self.ttl]
+            for path, _, _ in expired:
+                self._remove(path)
+            files = files[len(expired):]
+        if not self.max_bytes:
+            return
+        total = sum(size for _, size, _ in files)
+        for path, size, _ in files:
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    def clear(self):
+        """Vide le magasin, toutes versions confondues (artefacts et verrous)"""
+        try:
+            entries = list(os.scandir(self.root))
+        except FileNotFoundError:
+            return
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                shutil.rmtree(entry.path, ignore_errors=True)
+            else:
+                self._remove(entry.path)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'Répertoire': self.directory,
+                'Disque (Mo)': round(self.disk_bytes() / MB, 2),
+                'Constructions': self.builds,
+                'Lectures': self.reads,
+            }
+
+
+def build_store():
+    """Magasin configuré par ARTIFACT_STORE_DIR / _MB / _TTL (None si désactivé)"""
+    root = os.environ.get('ARTIFACT_STORE_DIR')
+    if not root:
+        return None
+    max_mb = os.environ.get('ARTIFACT_STORE_MB')
+    ttl = os.environ.get('ARTIFACT_STORE_TTL')
+    store = ArtifactStore(root, max_bytes=int(float(max_mb) * MB) if max_mb else None,
+                          ttl=float(ttl) if ttl else None)
+    store.prune()  # Versions précédentes et artefacts expirés, dès le démarrage
+    return store
@@ -0,0 +1,65 @@
+"""
+Génération de jeux de données synthétiques à grande échelle
+
+Les lignes sont tirées du jeu réel puis légèrement perturbées : les
+distributions (population, montants, départements, couleurs politiques)
+restent réalistes, les noms et identifiants sont rendus uniques.
+"""
+
+import numpy as np
+import pandas as pd
+
+from data import DATA_PATH, POP_BINS, POP_LABELS, clean_data, file_digest, optimize_dtypes
+
+
+def make_synthetic(n_rows, seed=0, path=DATA_PATH, compact=True):
+    """Retourne un DataFrame nettoyé de `n_rows` communes synthétiques"""
+    rng = np.random.default_rng(seed)
+    base = pd.read_csv(
+        path,
+        dtype={'CODE_COMMUNE': str, 'DEPARTEMENT': str},
+        na_values=['#N/D', '#N/A', 'N/A', '', ' ']
+    )
+    base = clean_data(base)
+
+    df = base.iloc[rng.integers(0, len(base), n_rows)].reset_index(drop=True)
+
+    # Perturbation multiplicative des montants et de la population
+    scale = rng.lognormal(0.0, 0.25, n_rows)
+    amount_cols = ['TOTAL_CHARGES', 'CHARGES_PERSONNEL', 'ACHATS_SERVICES',
+                   'CHARGES_FINANCIERES', 'CHARGES_EXCEPT', 'AUTRES_CHARGES_GESTION']
+    for col in amount_cols:
+        df[col] = (df[col] * scale).round(2)
+    df['FRAIS_REPRESENTATION'] = (df['FRAIS_REPRESENTATION'] * rng.lognormal(0.0, 0.3, n_rows)).round(2)
+    # Population inconnue (0) conservée telle quelle
+    df['POP_2022'] = np.where(df['POP_2022'] > 0, np.maximum((df['POP_2022'] * scale).round(), 1), 0).astype(int)
+
+    # Ratios recalculés pour rester cohérents avec les montants
+    df['EUR_PAR_HAB'] = np.where(
+        df['POP_2022'] > 0,
+        (df['FRAIS_REPRESENTATION'] / df['POP_2022'].where(df['POP_2022'] > 0)).round(2),
+        0.0
+    )
+    df['RATIO_FRAIS_REP'] = np.where(
+        df['TOTAL_CHARGES'] > 0,
+        (df['FRAIS_REPRESENTATION'] / df['TOTAL_CHARGES'] * 100).round(4),
+        0.0
+    )
+    df['CATEGORIE_POP'] = pd.cut(df['POP_2022'], bins=POP_BINS, labels=POP_LABELS)
+
+    # Coordonnées : petit déplacement autour de la commune d'origine
+    df['LATITUDE'] = df['LATITUDE'] + rng.normal(0, 0.05, n_rows)
+    df['LONGITUDE'] = df['LONGITUDE'] + rng.normal(0, 0.05, n_rows)
+
+    # Identifiants et noms uniques
+    ids = np.arange(n_rows)
+    df['NOM_COMMUNE'] = df['NOM_COMMUNE'] + ' ' + pd.Series(ids).astype(str)
+    df['SIREN'] = 200000000 + ids
+    df['SIRET'] = df['SIREN'].astype('int64') * 100000 + 19
+    df['INSEE'] = ids % 1000
+    df['CODE_COMMUNE'] = df['DEPARTEMENT'].fillna('00') + pd.Series(ids).astype(str).str.zfill(6)
+
+    if compact:
+        df = optimize_dtypes(df)
+    df.attrs['snapshot'] = f"synthetique:{n_rows}:{seed}:{file_digest(path)}:{'compact' if compact else 'brut'}"
+    return df
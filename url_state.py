@@ -0,0 +1,103 @@
+"""
+État des filtres dans l'URL et cache partagé des sélections
+
+Les filtres de la barre latérale sont sérialisés en paramètres d'URL courts
+(seuls ceux qui diffèrent des valeurs par défaut apparaissent), pour que
+les liens partagés rouvrent la même vue. La forme canonique de cet état
+sert aussi de clé au cache des sélections, commun à toutes les sessions :
+une vue populaire (un département, une couleur politique...) n'est filtrée
+qu'une fois.
+"""
+
+import math
+
+from cache import cache_manager, frame_key
+from data import default_filters, filter_data
+
+# Paramètres d'URL gérés par ce module
+PARAMS = ('q', 'd', 'pop', 'eur', 'frais', 'ratio', 'pol')
+
+RANGE_PARAMS = {
+    'pop': ('pop_range', 'pop_max', int),
+    'eur': ('eur_range', 'eur_max', float),
+    'frais': ('frais_range', 'frais_max', float),
+    'ratio': ('ratio_range', 'ratio_max', float),
+}
+
+# Codes courts des couleurs politiques
+POL_CODES = {
+    'Gauche': 'G',
+    'Droite': 'D',
+    'Centre': 'C',
+    'Extrême droite': 'ED',
+    'Courants politiques divers': 'DIV',
+    'Non classé': 'NC',
+}
+POL_NAMES = {code: name for name, code in POL_CODES.items()}
+
+
+def _fmt(value):
+    # repr : plus courte écriture décimale qui relit exactement le même flottant
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def encode(filters, facets):
+    """Paramètres d'URL décrivant `filters` (valeurs par défaut omises)"""
+    defaults = default_filters(facets)
+    params = {}
+    if filters['search_commune']:
+        params['q'] = filters['search_commune']
+    if filters['selected_depts']:
+        params['d'] = '.'.join(sorted(filters['selected_depts']))
+    for param, (name, _, _) in RANGE_PARAMS.items():
+        low, high = filters[name]
+        if (low, high) != defaults[name]:
+            params[param] = f"{_fmt(low)}_{_fmt(high)}"
+    if set(filters['coul_selection']) != set(defaults['coul_selection']):
+        params['pol'] = '.'.join(sorted(POL_CODES.get(p, p) for p in filters['coul_selection'])) or '-'
+    return params
+
+
+def decode(params, facets):
+    """Filtres décrits par des paramètres d'URL (valeurs invalides ignorées, bornes ramenées dans les limites)"""
+    filters = default_filters(facets)
+    if params.get('q'):
+        filters['search_commune'] = params['q']
+    if params.get('d'):
+        filters['selected_depts'] = [d for d in params['d'].split('.') if d in facets['depts']]
+    for param, (name, max_key, cast) in RANGE_PARAMS.items():
+        if not params.get(param) or max_key not in facets:
+            continue
+        try:
+            values = [float(v) for v in params[param].split('_')]
+            if not all(math.isfinite(v) for v in values):
+                continue  # inf / nan : int() déborderait, les bornes n'auraient pas de sens
+            low, high = (cast(v) for v in values)
+        except (ValueError, OverflowError):
+            continue
+        upper = facets[max_key]
+        low, high = max(cast(0), min(low, upper)), max(cast(0), min(high, upper))
+        filters[name] = (min(low, high), max(low, high))
+    if params.get('pol'):
+        names = [POL_NAMES.get(code, code) for code in params['pol'].split('.')]
+        filters['coul_selection'] = [p for p in facets['coul_pol'] if p in names]
+    return filters
+
+
+def canonical(filters):
+    """Forme canonique (hashable) d'un état de filtres"""
+    return (
+        filters['search_commune'],
+        tuple(sorted(filters['selected_depts'])),
+        tuple(filters['pop_range']),
+        tuple(filters['eur_range']),
+        tuple(filters['frais_range']),
+        tuple(filters['ratio_range']),
+        tuple(sorted(filters['coul_selection'])),
+    )
+
+
+def cached_selection(df, filters):
+    """Sélection filtrée, partagée entre sessions via la forme canonique des filtres"""
+    key = (frame_key(df), canonical(filters))
+    return cache_manager.namespace('selections').get_or_compute(key, lambda: filter_data(df, **filters))
@@ -0,0 +1,122 @@
+"""
+Contrôle qualité du jeu de données
+
+Règles déclaratives évaluées de façon vectorisée (un masque booléen par
+règle, sans boucle sur les lignes). Le résultat est calculé une fois par
+instantané : rapport de synthèse + lignes signalées.
+"""
+
+from dataclasses import dataclass
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+from cache import cache_manager, frame_key
+
+CHARGE_COLS = ['CHARGES_PERSONNEL', 'ACHATS_SERVICES', 'CHARGES_FINANCIERES',
+               'CHARGES_EXCEPT', 'AUTRES_CHARGES_GESTION']
+
+# Emprise de la France métropolitaine (Corse comprise), en degrés
+METRO_LAT = (41.3, 51.2)
+METRO_LON = (-5.3, 9.7)
+
+# Tolérances des ratios recalculés (arrondis à 2 et 4 décimales dans la source)
+EUR_PAR_HAB_TOL = 0.006
+RATIO_TOL = 0.00006
+
+
+@dataclass(frozen=True)
+class Rule:
+    """Règle de qualité : `check` renvoie le masque des lignes en infraction"""
+    name: str
+    description: str
+    severity: str  # 'erreur' ou 'avertissement'
+    columns: tuple
+    check: Callable[[pd.DataFrame], np.ndarray]
+
+
+def _num(df, col):
+    return df[col].to_numpy(dtype=np.float64)
+
+
+def _outside(values, bounds):
+    # Les NaN ne sont pas « hors bornes » : ils relèvent de la règle des valeurs manquantes
+    return (values < bounds[0]) | (values > bounds[1])
+
+
+def _eur_par_hab_mismatch(df):
+    pop = _num(df, 'POP_2022')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        expected = np.where(pop > 0, _num(df, 'FRAIS_REPRESENTATION') / pop, np.nan)
+    return np.abs(_num(df, 'EUR_PAR_HAB') - expected) > EUR_PAR_HAB_TOL
+
+
+def _ratio_mismatch(df):
+    total = _num(df, 'TOTAL_CHARGES')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        expected = np.where(total > 0, _num(df, 'FRAIS_REPRESENTATION') / total * 100, np.nan)
+    return np.abs(_num(df, 'RATIO_FRAIS_REP') - expected) > RATIO_TOL
+
+
+def _subtotals_exceed(df):
+    subtotal = df[CHARGE_COLS].to_numpy(dtype=np.float64).sum(axis=1)
+    return subtotal > _num(df, "TOTAL_CHARGES") + 0.05  # arrondis au centime des postes
+
+
+RULES = [
+    Rule('population_nulle', "Population absente ou nulle", 'erreur',
+         ('POP_2022',), lambda df: _num(df, 'POP_2022') <= 0),
+    Rule('montant_negatif', "Frais ou charges négatifs", 'erreur',
+         ('FRAIS_REPRESENTATION', 'TOTAL_CHARGES', *CHARGE_COLS),
+         lambda df: (df[['FRAIS_REPRESENTATION', 'TOTAL_CHARGES', *CHARGE_COLS]].to_numpy() < 0).any(axis=1)),
+    Rule('ratio_hors_bornes', "Ratio frais / charges hors de [0 ; 100] %", 'erreur',
+         ('RATIO_FRAIS_REP',), lambda df: _outside(_num(df, 'RATIO_FRAIS_REP'), (0, 100))),
+    Rule('coordonnees_manquantes', "Coordonnées absentes ou illisibles (#N/D...)", 'avertissement',
+         ('LATITUDE', 'LONGITUDE'),
+         lambda df: np.isnan(_num(df, 'LATITUDE')) | np.isnan(_num(df, 'LONGITUDE'))),
+    Rule('hors_metropole', "Coordonnées hors de la France métropolitaine", 'erreur',
+         ('LATITUDE', 'LONGITUDE'),
+         lambda df: _outside(_num(df, 'LATITUDE'), METRO_LAT) | _outside(_num(df, 'LONGITUDE'), METRO_LON)),
+    Rule('eur_par_hab_incoherent', "EUR/hab ≠ frais / population", 'erreur',
+         ('EUR_PAR_HAB', 'FRAIS_REPRESENTATION', 'POP_2022'), _eur_par_hab_mismatch),
+    Rule('ratio_incoherent', "Ratio ≠ frais / charges totales × 100", 'erreur',
+         ('RATIO_FRAIS_REP', 'FRAIS_REPRESENTATION', 'TOTAL_CHARGES'), _ratio_mismatch),
+    Rule('siret_duplique', "SIRET présent plusieurs fois", 'erreur',
+         ('SIRET',), lambda df: df['SIRET'].duplicated(keep=False).to_numpy()),
+    Rule('insee_duplique', "Code INSEE présent plusieurs fois", 'erreur',
+         ('CODE_COMMUNE',), lambda df: df['CODE_COMMUNE'].duplicated(keep=False).to_numpy()),
+    Rule('sous_totaux_excessifs', "Somme des postes de charges > charges totales", 'erreur',
+         ('TOTAL_CHARGES', *CHARGE_COLS), _subtotals_exceed),
+]
+
+
+def run_rules(df, rules=RULES):
+    """Matrice des infractions (lignes x règles) ; les règles aux colonnes absentes sont ignorées"""
+    applicable = [r for r in rules if all(c in df.columns for c in r.columns)]
+    masks = {r.name: np.asarray(r.check(df), dtype=bool) for r in applicable}
+    return pd.DataFrame(masks, index=df.index), applicable
+
+
+def validate(df, rules=RULES):
+    """Retourne (rapport par règle, lignes signalées avec la liste de leurs infractions)"""
+    violations, applicable = run_rules(df, rules)
+
+    report = pd.DataFrame({
+        'Règle': [r.name for r in applicable],
+        'Description': [r.description for r in applicable],
+        'Gravité': [r.severity for r in applicable],
+        'Lignes': [int(violations[r.name].sum()) for r in applicable],
+    })
+
+    flagged_mask = violations.to_numpy().any(axis=1)
+    flagged = df[flagged_mask].copy()
+    hits = violations[flagged_mask]
+    names = np.array(hits.columns)
+    flagged.insert(0, 'ANOMALIES', [', '.join(names[row]) for row in hits.to_numpy()])
+    return report, flagged
+
+
+def validate_dataset(df):
+    """Contrôle qualité de l'instantané, calculé une fois et partagé"""
+    return cache_manager.namespace('dataset').get_or_compute(('quality', frame_key(df)), lambda: validate(df))
@@ -0,0 +1,110 @@
+"""
+Préchauffage des artefacts au démarrage du processus
+
+Construit en arrière-plan l'instantané du jeu de données, les index de la
+barre latérale et les artefacts de la vue par défaut (carte, figures Budget),
+pour que le premier visiteur après un déploiement ne paie pas ces calculs.
+Un petit endpoint HTTP expose l'état : /ready répond 200 une fois tout prêt,
+503 sinon.
+"""
+
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_lock = threading.Lock()
+_thread = None
+_ready = threading.Event()
+_status = {'started_at': None, 'duration_s': None, 'steps': {}, 'error': None}
+
+
+def _step(name, func):
+    """Exécute une étape en enregistrant sa durée"""
+    with _lock:
+        _status['steps'][name] = {'state': 'running'}
+    t0 = time.perf_counter()
+    result = func()
+    with _lock:
+        _status['steps'][name] = {'state': 'done', 'duration_s': round(time.perf_counter() - t0, 3)}
+    return result
+
+
+def _warm():
+    # Imports différés : le thread démarre avant que ces modules soient chargés
+    from data import dataset_facets, default_filters, load_dataset
+    from figures import build_budget_figures
+    from maps import create_map
+    from url_state import cached_selection
+    from validation import validate_dataset
+
+    t0 = time.perf_counter()
+    try:
+        df = _step('dataset', load_dataset)
+        facets = _step('indexes', lambda: dataset_facets(df))
+        _step('quality', lambda: validate_dataset(df))
+        df_default = cached_selection(df, default_filters(facets))
+
+        # Les artefacts de la vue par défaut sont indépendants : en parallèle
+        with ThreadPoolExecutor(max_workers=2, thread_name_prefix='warmup') as pool:
+            futures = [
+                pool.submit(_step, 'map', lambda: create_map(df_default, color_by='EUR_PAR_HAB')),
+                pool.submit(_step, 'budget_figures', lambda: build_budget_figures(df_default)),
+            ]
+            for future in futures:
+                future.result()
+    except Exception as exc:
+        with _lock:
+            _status['error'] = repr(exc)
+        return
+    with _lock:
+        _status['duration_s'] = round(time.perf_counter() - t0, 3)
+    _ready.set()
+
+
+def start():
+    """Lance le préchauffage (une seule fois par processus)"""
+    global _thread
+    with _lock:
+        if _thread is not None:
+            return
+        _status['started_at'] = time.time()
+        _thread = threading.Thread(target=_warm, name='warmup', daemon=True)
+        _thread.start()
+
+
+def is_ready():
+    return _ready.is_set()
+
+
+def wait(timeout=None):
+    return _ready.wait(timeout)
+
+
+def status():
+    with _lock:
+        return {'ready': is_ready(), **json.loads(json.dumps(_status))}
+
+
+class _ReadyHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip('/') != '/ready':
+            self.send_error(404)
+            return
+        body = json.dumps(status()).encode()
+        self.send_response(200 if is_ready() else 503)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Pas de log à chaque healthcheck
+
+
+def serve_health(port=8502, host='0.0.0.0'):
+    """Démarre l'endpoint /ready dans un thread démon"""
+    server = ThreadingHTTPServer((host, port), _ReadyHandler)
+    threading.Thread(target=server.serve_forever, name='ready-endpoint', daemon=True).start()
+    return server